@@ -31,7 +31,7 @@ from .models import (
     TrialHistory,
     Customer
 )
-from django.db.models import Exists, OuterRef, Q, Subquery
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Sum
 from django.utils.translation import gettext_lazy as _
 
 
@@ -763,6 +763,20 @@ class TransactionAdmin(admin.ModelAdmin):
     raw_id_fields = ("user", "quota_batch")
     date_hierarchy = "created_at"
 
+    def get_queryset(self, request):
+        """
+        Load everything document_link and the list columns touch in bulk.
+
+        related_object is prefetched with one query per content type instead of
+        one generic lookup per row.
+        """
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("user", "content_type", "quota_batch__order_item__order")
+            .prefetch_related("related_object")
+        )
+
     def amount_display(self, obj):
         color = "green" if obj.direction == Transaction.Direction.CREDIT else "red"
         prefix = "+" if obj.direction == Transaction.Direction.CREDIT else "-"
@@ -832,12 +846,17 @@ class OrderItemInline(admin.TabularInline):
     fields = ("offer", "quantity", "price")
     raw_id_fields = ("offer",)
 
+    def get_queryset(self, request):
+        """Load offers and the parent order with the items (used by OrderItem.__str__)."""
+        return super().get_queryset(request).select_related("offer", "order")
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Admin configuration for Order."""
 
     list_display = ("id", "user", "total_amount", "currency", "status", "payment_method", "created_at", "paid_at")
+    list_select_related = ("user",)
     list_filter = ("status", "payment_method", "created_at")
     search_fields = ("id", "user_id", "payment_id")
     readonly_fields = ("created_at",)
@@ -948,52 +967,41 @@ class CustomerAdmin(admin.ModelAdmin):
         from django.utils import timezone
         now = timezone.now()
 
-        # Get all products ever associated with the user
-        all_batches = obj.quota_batches.select_related("product").all()
-        
-        products_data = {}
-        for qb in all_batches:
-            p_id = qb.product_id
-            if p_id not in products_data:
-                products_data[p_id] = {
-                    "obj": qb.product,
-                    "is_active": False,
-                    "remaining": 0,
-                    "expires": None
-                }
-            
-            # Logic for active status
-            is_qb_active = (
-                qb.state == QuotaBatch.State.ACTIVE and 
-                (qb.expires_at is None or qb.expires_at > now) and
-                qb.remaining_quantity > 0
+        # One row per product ever associated with the user; balance and
+        # latest expiry are aggregated over active, unexpired, non-empty batches
+        active = (
+            Q(state=QuotaBatch.State.ACTIVE, remaining_quantity__gt=0)
+            & (Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        )
+        products_rows = (
+            obj.quota_batches.order_by()
+            .values("product_id", "product__name")
+            .annotate(
+                active_count=Count("id", filter=active),
+                remaining=Sum("remaining_quantity", filter=active),
+                expires=Max("expires_at", filter=active),
             )
-            
-            if is_qb_active:
-                products_data[p_id]["is_active"] = True
-                products_data[p_id]["remaining"] += qb.remaining_quantity
-                if qb.expires_at:
-                    if not products_data[p_id]["expires"] or qb.expires_at > products_data[p_id]["expires"]:
-                        products_data[p_id]["expires"] = qb.expires_at
+            .order_by("product__name")
+        )
 
         active_rows = []
         history_rows = []
 
-        for p_id, data in products_data.items():
-            product = data["obj"]
+        for data in products_rows:
             # Level 2 link: Custom report view
-            report_url = reverse("admin:billable_customer_product_report", args=[obj.id, p_id])
-            
+            report_url = reverse("admin:billable_customer_product_report", args=[obj.id, data["product_id"]])
+            is_active = data["active_count"] > 0
+
             row = (
                 f'<tr style="border-bottom: 1px solid var(--border-color);">'
-                f'<td style="padding: 8px;">{product.name}</td>'
-                f'<td style="padding: 8px; text-align: center;">{data["remaining"] if data["is_active"] else "-"}</td>'
+                f'<td style="padding: 8px;">{data["product__name"]}</td>'
+                f'<td style="padding: 8px; text-align: center;">{data["remaining"] if is_active else "-"}</td>'
                 f'<td style="padding: 8px; text-align: center;">{data["expires"].strftime("%d.%m.%Y") if data["expires"] else "-"}</td>'
                 f'<td style="padding: 8px; text-align: right;"><a href="{report_url}" class="button" style="padding: 2px 10px; font-size: 11px;">{_("Details")}</a></td>'
                 f'</tr>'
             )
             
-            if data["is_active"]:
+            if is_active:
                 active_rows.append(row)
             else:
                 history_rows.append(row)
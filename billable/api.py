@@ -8,16 +8,22 @@ and demo trial grant. Docstrings are used to generate OpenAPI descriptions.
 
 from __future__ import annotations
 
+import base64
 import logging
 from datetime import datetime
 from typing import List, Dict, Any
 from uuid import UUID
 
 from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
 from django.db import IntegrityError
+from django.db.models import Prefetch, Q
+from django.http import HttpResponse
 from ninja import Router
 from ninja.security import HttpBearer
 
+from .cache import acatalog_cache_key
 from .conf import billable_settings
 from .models import (
     Order, 
@@ -26,6 +32,7 @@ from .models import (
     Referral, 
     ExternalIdentity, 
     Offer, 
+    OfferItem,
     QuotaBatch, 
     Transaction
 )
@@ -52,10 +59,14 @@ from .schemas import (
     CustomerMergeResponse
 )
 from .services import OrderService, TransactionService, BalanceService, ProductService, CustomerService
+from .signals import referral_attached, trial_activated
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Maximum number of ledger rows returned per GET /wallet/transactions page
+TRANSACTIONS_PAGE_SIZE = 100
+
 
 class APIKeyAuth(HttpBearer):
     """Bearer token authentication for the billing API.
@@ -119,6 +130,57 @@ async def aresolve_user_id_by_identity(provider: str, external_id: str) -> int:
     return user.id
 
 
+IDENTITY_TOKEN_SALT = "billable.identity_token"
+
+
+def make_identity_token(user_id: int, identity_id: int) -> str:
+    """Sign an identity token returned by POST /identify.
+
+    The token embeds the resolved user_id and identity_id and is signed with
+    BILLABLE_API_TOKEN (falling back to SECRET_KEY when unset).
+
+    Args:
+        user_id: Local billing user id.
+        identity_id: ExternalIdentity primary key.
+
+    Returns:
+        URL-safe signed token string.
+    """
+    return signing.dumps(
+        {"uid": user_id, "iid": identity_id},
+        key=billable_settings.API_TOKEN,
+        salt=IDENTITY_TOKEN_SALT,
+        compress=True,
+    )
+
+
+async def aresolve_identity_token(token: str) -> int | None:
+    """Verify an identity token and return the current user_id of its identity.
+
+    The user is read from the embedded identity (by primary key) rather than the
+    embedded user_id, so tokens follow identities moved by merge_customers.
+
+    Returns None if the signature is invalid or the token is older than
+    BILLABLE_IDENTITY_TOKEN_MAX_AGE; callers then fall back to external_id + provider.
+
+    Raises:
+        ValueError: If the identity no longer exists or is not linked to a user.
+    """
+    try:
+        payload = signing.loads(
+            token,
+            key=billable_settings.API_TOKEN,
+            salt=IDENTITY_TOKEN_SALT,
+            max_age=billable_settings.IDENTITY_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return None
+    user_id = await ExternalIdentity.objects.filter(pk=payload.get("iid")).values_list("user_id", flat=True).afirst()
+    if user_id is None:
+        raise ValueError("identity_token refers to an identity that no longer exists")
+    return user_id
+
+
 @router.post("/identify", response={200: IdentifySchemaOut, 400: CommonResponse})
 async def aidentify(request, data: IdentifySchemaIn):
     """Identify an external identity and ensure a local billing user exists.
@@ -169,6 +231,7 @@ async def aidentify(request, data: IdentifySchemaIn):
         "created_user": created_user,
         "trial_eligible": trial_eligible,
         "metadata": identity.metadata or {},
+        "identity_token": make_identity_token(user_id, identity.id),
     }
 
 
@@ -224,12 +287,13 @@ async def acheck_user_balance(request, user_id: int | None = None, product_key:
     return result
 
 
-@router.get("/user-products", response={200: List[ActiveBatchSchema], 400: CommonResponse})
+@router.get("/user-products", response={200: List[ActiveBatchSchema], 400: CommonResponse}, exclude_none=True)
 async def alist_user_products(request, user_id: int | None = None, product_key: str = "", external_id: str | None = None, provider: str | None = None):
     """List active quota batches for the user (user-products / inventory).
 
     Query params: user_id (optional), product_key (optional filter), external_id (optional), provider (optional).
-    Provide either user_id or (external_id + provider). Returns list of ActiveBatchSchema.
+    Provide either user_id or (external_id + provider). Returns list of ActiveBatchSchema;
+    null fields (e.g. expires_at) are omitted.
     """
     provider_value = provider or "default"
     resolved_user_id = user_id
@@ -258,6 +322,12 @@ async def aconsume_user_quota(request, data: QuotaConsumeSchema):
     provider_value = data.provider or "default"
     resolved_user_id = data.user_id
 
+    if resolved_user_id is None and data.identity_token:
+        try:
+            resolved_user_id = await aresolve_identity_token(data.identity_token)
+        except ValueError as exc:
+            return 400, {"success": False, "message": str(exc)}
+
     if resolved_user_id is None and data.external_id:
         resolved_user_id = await aresolve_user_id_by_identity(
             provider=provider_value, external_id=data.external_id
@@ -295,6 +365,12 @@ async def ademo_grant_trial(request, data: TrialGrantSchema):
     resolved_external_id = data.external_id
     resolved_user_id = data.user_id
 
+    if resolved_user_id is None and data.identity_token:
+        try:
+            resolved_user_id = await aresolve_identity_token(data.identity_token)
+        except ValueError as exc:
+            return 400, {"success": False, "message": str(exc)}
+
     if resolved_user_id is None and resolved_external_id:
         resolved_user_id = await aresolve_user_id_by_identity(
             provider=provider_value, external_id=resolved_external_id
@@ -345,8 +421,7 @@ async def ademo_grant_trial(request, data: TrialGrantSchema):
                 )
 
     # 5. Send signal for notifications
-    from .signals import trial_activated
-    product_names = [batch.product.name async for batch in QuotaBatch.objects.filter(id__in=[b.id for b in batches]).select_related('product').aiterator()]
+    product_names = [batch.product.name async for batch in QuotaBatch.objects.filter(id__in=[b.id for b in batches]).select_related('product')]
     trial_activated.send(sender=TransactionService, user_id=resolved_user_id, products=product_names)
 
     return {"success": True, "message": "Trial granted", "data": {"products": product_names, "metadata": trial_metadata}}
@@ -365,6 +440,13 @@ async def aget_catalog_offer(request, sku: str):
     """
     # Normalize SKU to uppercase
     normalized_sku = sku.upper() if sku else ""
+    cache_ttl = billable_settings.CATALOG_CACHE_TTL
+    if cache_ttl:
+        cache_key = await acatalog_cache_key("offer", normalized_sku)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
     offer = await (
         Offer.objects.filter(sku=normalized_sku, is_active=True)
         .prefetch_related("items__product")
@@ -372,36 +454,84 @@ async def aget_catalog_offer(request, sku: str):
     )
     if not offer:
         return 404, {"success": False, "message": "Offer not found"}
-    return offer
+    data = OfferSchema.model_validate(offer).model_dump()
+    if cache_ttl:
+        await cache.aset(cache_key, data, cache_ttl)
+    return data
+
+
+# Columns loaded for catalog listings; heavy JSON metadata is fetched only on request
+_CATALOG_LIST_FIELDS = ("sku", "name", "price", "currency", "description", "image", "is_active")
+
+
+def _catalog_list_queryset(include_metadata: bool):
+    """Build the active-offer queryset used by the catalog listing.
+
+    Offer items are prefetched with only the columns OfferItemSchema needs.
+    Unless include_metadata is True, Offer.metadata is deferred.
+    """
+    items_qs = OfferItem.objects.only(
+        "offer", "product", "quantity", "period_unit", "period_value"
+    ).select_related("product")
+    qs = Offer.objects.filter(is_active=True).prefetch_related(Prefetch("items", queryset=items_qs))
+    if not include_metadata:
+        qs = qs.only(*_CATALOG_LIST_FIELDS)
+    return qs
 
 
 @router.get("/catalog", response=List[OfferSchema])
-async def alist_catalog(request):
+async def alist_catalog(request, include: str = ""):
     """List all active offers (catalog) with nested offer items and products.
 
     Returns offers with is_active=True, prefetched items and product details.
     Each offer includes: sku, name, price, currency, description, image, is_active, items, metadata.
     Optional query param: sku (repeatable) — filter by SKU list; preserves order.
     If sku not provided, returns full catalog.
+    Optional query param: include=metadata — load offer metadata (returned empty otherwise).
     """
+    include_metadata = "metadata" in include.split(",")
     sku_list = request.GET.getlist("sku")
+    cache_ttl = billable_settings.CATALOG_CACHE_TTL
+    if cache_ttl:
+        cache_key = await acatalog_cache_key(
+            "list", int(include_metadata), ",".join(sku.upper() for sku in sku_list)
+        )
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+    qs = _catalog_list_queryset(include_metadata)
     if not sku_list:
-        offers = []
-        async for offer in Offer.objects.filter(is_active=True).prefetch_related("items__product").aiterator():
-            offers.append(offer)
-        return offers
-
-    # Normalize all SKUs to uppercase
-    normalized_sku_list = [sku.upper() for sku in sku_list]
-    qs = (
-        Offer.objects.filter(sku__in=normalized_sku_list, is_active=True)
-        .prefetch_related("items__product")
-    )
-    by_sku: dict[str, Offer] = {}
-    async for offer in qs.aiterator():
-        by_sku[offer.sku] = offer
-    # Return in original order, matching by normalized SKU
-    return [by_sku[normalized_sku] for normalized_sku in normalized_sku_list if normalized_sku in by_sku]
+        offers = [offer async for offer in qs]
+    else:
+        # Normalize all SKUs to uppercase
+        normalized_sku_list = [sku.upper() for sku in sku_list]
+        by_sku: dict[str, Offer] = {offer.sku: offer async for offer in qs.filter(sku__in=normalized_sku_list)}
+        # Return in original order, matching by normalized SKU
+        offers = [by_sku[normalized_sku] for normalized_sku in normalized_sku_list if normalized_sku in by_sku]
+
+    if not include_metadata:
+        # Assigning the deferred field keeps serialization from issuing a per-row query
+        for offer in offers:
+            offer.metadata = {}
+    data = [OfferSchema.model_validate(offer).model_dump() for offer in offers]
+    if cache_ttl:
+        await cache.aset(cache_key, data, cache_ttl)
+    return data
+
+
+# Columns projected for QuotaBatchSchema; product columns are fetched through the JOIN
+_QUOTA_BATCH_FIELDS = ("id", "initial_quantity", "remaining_quantity", "valid_from", "expires_at", "state")
+_QUOTA_BATCH_PRODUCT_FIELDS = tuple(
+    f"product__{name}"
+    for name in ("id", "product_key", "name", "description", "product_type", "is_active", "metadata", "created_at")
+)
+
+
+def _nest_product_fields(row: dict[str, Any]) -> dict[str, Any]:
+    """Move ``product__*`` keys of a values() row into a nested ``product`` dict."""
+    row["product"] = {field[len("product__"):]: row.pop(field) for field in _QUOTA_BATCH_PRODUCT_FIELDS}
+    return row
 
 
 @router.get("/wallet", response={200: WalletBalanceSchema, 404: CommonResponse})
@@ -422,23 +552,18 @@ async def aget_wallet(request, user_id: int | None = None, external_id: str | No
     if not uid:
          return 404, {"success": False, "message": "User not found"}
 
-    balances = {}
-    async for batch in QuotaBatch.objects.filter(
-        user_id=uid, 
-        state=QuotaBatch.State.ACTIVE
-    ).select_related('product').aiterator():
-        key = batch.product.product_key or f"prod_{batch.product.id}"
-        balances[key] = balances.get(key, 0) + batch.remaining_quantity
-
-    return {"user_id": uid, "balances": balances}
+    balances = await BalanceService.aget_wallet_balances(uid)
+    # Balances come from our own aggregate, so the per-entry validation is skipped
+    return WalletBalanceSchema.model_construct(user_id=uid, balances=balances)
 
 
-@router.get("/wallet/batches", response={200: List[QuotaBatchSchema], 404: CommonResponse})
+@router.get("/wallet/batches", response={200: List[QuotaBatchSchema], 404: CommonResponse}, exclude_none=True)
 async def aget_wallet_batches(request, user_id: int | None = None, external_id: str | None = None, provider: str | None = None):
     """List detailed active quota batches for the user (wallet entries with state and expiry).
 
     Query params: user_id (optional), external_id (optional), provider (optional).
     Returns all ACTIVE batches; each batch has product, initial/remaining quantity, expires_at, state.
+    Null fields are omitted.
     """
     provider_value = provider or "default"
     uid = user_id
@@ -452,29 +577,60 @@ async def aget_wallet_batches(request, user_id: int | None = None, external_id:
          return 404, {"success": False, "message": "User not found"}
 
     batches = []
-    async for batch in QuotaBatch.objects.filter(
+    async for row in QuotaBatch.objects.filter(
         user_id=uid, 
         state=QuotaBatch.State.ACTIVE
-    ).select_related('product').aiterator():
-        batches.append(batch)
+    ).values(*_QUOTA_BATCH_FIELDS, *_QUOTA_BATCH_PRODUCT_FIELDS).aiterator(chunk_size=500):
+        batches.append(_nest_product_fields(row))
     return batches
 
 
-@router.get("/wallet/transactions", response={200: List[TransactionSchema], 404: CommonResponse})
+def _encode_tx_cursor(created_at: datetime, tx_id: UUID) -> str:
+    """Encode a keyset pagination cursor for the transaction ledger.
+
+    Args:
+        created_at: Creation timestamp of the last transaction on the page.
+        tx_id: Primary key of the last transaction on the page.
+
+    Returns:
+        Opaque URL-safe base64 string of ``created_at|id``.
+    """
+    raw = f"{created_at.isoformat()}|{tx_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_tx_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Decode a cursor produced by _encode_tx_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        ts_value, id_value = raw.split("|", 1)
+        return datetime.fromisoformat(ts_value), UUID(id_value)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+@router.get("/wallet/transactions", response={200: List[TransactionSchema], 400: CommonResponse, 404: CommonResponse})
 async def aget_wallet_transactions(
     request, 
+    response: HttpResponse,
     user_id: int | None = None, 
     external_id: str | None = None, 
     provider: str | None = None,
     product_key: str | None = None,
     action_type: str | None = None,
     date_from: datetime | None = None,
+    cursor: str | None = None,
 ):
     """List transaction history (ledger) for the user with optional filters.
 
     Query params: user_id (optional), external_id (optional), provider (optional),
-    product_key (optional), action_type (optional), date_from (optional).
-    Returns up to 100 transactions, newest first.
+    product_key (optional), action_type (optional), date_from (optional), cursor (optional).
+    Returns up to 100 transactions, newest first. If more rows exist, the X-Next-Cursor
+    response header holds the cursor to pass for the next page (keyset pagination).
     """
     provider_value = provider or "default"
     uid = user_id
@@ -487,7 +643,6 @@ async def aget_wallet_transactions(
     if not uid:
          return 404, {"success": False, "message": "User not found"}
 
-    txs = []
     qs = Transaction.objects.filter(user_id=uid)
     if product_key:
         # Normalize product_key to uppercase
@@ -497,10 +652,21 @@ async def aget_wallet_transactions(
         qs = qs.filter(action_type=action_type)
     if date_from:
         qs = qs.filter(created_at__gte=date_from)
-        
-    qs = qs.order_by('-created_at')[:100]
-    async for tx in qs.aiterator():
-        txs.append(tx)
+    if cursor:
+        try:
+            cursor_ts, cursor_id = _decode_tx_cursor(cursor)
+        except ValueError as e:
+            return 400, {"success": False, "message": str(e)}
+        qs = qs.filter(Q(created_at__lt=cursor_ts) | Q(created_at=cursor_ts, id__lt=cursor_id))
+
+    qs = qs.order_by('-created_at', '-id').values(
+        "id", "user_id", "amount", "direction", "action_type", "created_at", "metadata"
+    )[:TRANSACTIONS_PAGE_SIZE]
+    # The page is bounded, so fetch it in one go instead of chunked aiterator() reads
+    txs = [tx async for tx in qs]
+    if len(txs) == TRANSACTIONS_PAGE_SIZE:
+        last = txs[-1]
+        response["X-Next-Cursor"] = _encode_tx_cursor(last["created_at"], last["id"])
     return txs
 
 
@@ -515,6 +681,12 @@ async def aexchange_offer(request, data: ExchangeSchema):
     provider_value = data.provider or "default"
     resolved_user_id = data.user_id
 
+    if resolved_user_id is None and data.identity_token:
+        try:
+            resolved_user_id = await aresolve_identity_token(data.identity_token)
+        except ValueError as exc:
+            return 400, {"success": False, "message": str(exc)}
+
     if resolved_user_id is None and data.external_id:
         resolved_user_id = await aresolve_user_id_by_identity(
             provider=provider_value, external_id=data.external_id
@@ -552,6 +724,12 @@ async def acreate_order(request, data: OrderCreateSchema):
     provider_value = data.provider or "default"
     resolved_user_id = data.user_id
 
+    if resolved_user_id is None and data.identity_token:
+        try:
+            resolved_user_id = await aresolve_identity_token(data.identity_token)
+        except ValueError as exc:
+            return 400, {"success": False, "message": str(exc)}
+
     if resolved_user_id is None and data.external_id:
         resolved_user_id = await aresolve_user_id_by_identity(
             provider=provider_value, external_id=data.external_id
@@ -597,7 +775,6 @@ async def aconfirm_order_payment(request, order_id: int, data: OrderConfirmSchem
         return 404, {"success": False, "message": "Order not found"}
     
     order_dict = await OrderService.aserialize_order_to_dict(order)
-    from .schemas import OrderSchema
     order_data = OrderSchema.model_validate(order_dict).model_dump(mode="json")
     
     return {
@@ -629,7 +806,6 @@ async def arefund_order(request, order_id: int, data: OrderRefundSchema):
         return 404, {"success": False, "message": "Order not found"}
     
     order_dict = await OrderService.aserialize_order_to_dict(order)
-    from .schemas import OrderSchema
     order_data = OrderSchema.model_validate(order_dict).model_dump(mode="json")
     
     return {
@@ -675,8 +851,6 @@ async def aassign_referral(request, data: ReferralAssignSchema):
     if by_ids:
         referrer_user_id, referee_user_id = data.referrer_id, data.referee_id
         # Explicitly verify user existence to satisfy "not processed if user does not exist" requirement
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
         if not await User.objects.filter(pk=referrer_user_id).aexists():
             return 400, {"success": False, "message": "Referrer user not found in database"}
         if not await User.objects.filter(pk=referee_user_id).aexists():
@@ -706,7 +880,6 @@ async def aassign_referral(request, data: ReferralAssignSchema):
             defaults={"metadata": data.metadata or {}},
         )
         if created:
-             from .signals import referral_attached
              referral_attached.send(sender=None, referral=referral)
         return {
             "success": True,
@@ -747,7 +920,7 @@ async def amerge_customers(request, data: CustomerMergeSchema):
     """Merge two customers: move all data from source_user to target_user.
 
     Moves orders, quota batches, transactions, identities, and referrals.
-    Atomically performs the merge and sends customers_merged signal.
+    Atomically performs the merge; customers_merged is sent after commit.
     """
     try:
         stats = await CustomerService.amerge_customers(
@@ -15,3 +15,20 @@ class BillableConfig(AppConfig):
         """Register signals when application is ready."""
         import billable.signals  # noqa: F401
         import billable.admin  # noqa: F401
+
+        from django.db.models.signals import post_delete, post_save
+
+        from .cache import invalidate_all_balances, invalidate_batch_owner_balance, invalidate_catalog
+        from .models import Offer, OfferItem, Product, QuotaBatch
+
+        # Any catalog change drops the cached GET /catalog responses
+        for model in (Offer, OfferItem, Product):
+            post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f"billable_catalog_save_{model.__name__}")
+            post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f"billable_catalog_delete_{model.__name__}")
+
+        # Balance entries are keyed by product_key and type, and by the owner's batches
+        post_save.connect(invalidate_all_balances, sender=Product, dispatch_uid="billable_balance_save_Product")
+        post_delete.connect(invalidate_all_balances, sender=Product, dispatch_uid="billable_balance_delete_Product")
+        post_save.connect(invalidate_batch_owner_balance, sender=QuotaBatch, dispatch_uid="billable_balance_save_QuotaBatch")
+        post_delete.connect(invalidate_batch_owner_balance, sender=QuotaBatch, dispatch_uid="billable_balance_delete_QuotaBatch")
+
@@ -0,0 +1,130 @@
+"""Caching helpers for read-mostly billing data.
+
+Entries are stored in Django's cache framework, so a shared backend (e.g. Redis)
+serves all workers, while the default LocMemCache keeps a per-process cache.
+Invalidation counters live in the same cache: with LocMemCache a change only
+invalidates the current process, so catalog and balance caching are off by
+default and should be enabled only with a shared backend.
+Catalog entries are namespaced by a generation counter that is bumped whenever
+an Offer, OfferItem or Product changes, which invalidates all of them at once.
+Balance entries carry a per-user version (bumped when one of the user's
+batches changes) and a global generation (bumped by bulk writes such as the
+expiry sweep or product changes).
+"""
+
+from __future__ import annotations
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_GENERATION_KEY = "billable:catalog:generation"
+BALANCE_GENERATION_KEY = "billable:balance:generation"
+
+
+def catalog_cache_key(*parts: object) -> str:
+    """
+    Builds a cache key for a catalog entry bound to the current generation.
+
+    Args:
+        *parts: Values identifying the entry (e.g. endpoint name and SKUs).
+
+    Returns:
+        str: Cache key that changes after every catalog invalidation.
+    """
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        generation = 0
+        cache.add(CATALOG_GENERATION_KEY, generation, None)
+    return ":".join(["billable:catalog", str(generation), *map(str, parts)])
+
+
+async def acatalog_cache_key(*parts: object) -> str:
+    """Async variant of catalog_cache_key."""
+    generation = await cache.aget(CATALOG_GENERATION_KEY)
+    if generation is None:
+        generation = 0
+        await cache.aadd(CATALOG_GENERATION_KEY, generation, None)
+    return ":".join(["billable:catalog", str(generation), *map(str, parts)])
+
+
+def invalidate_catalog(**kwargs) -> None:
+    """
+    Signal receiver: invalidates all cached catalog entries.
+
+    Connected to post_save/post_delete of catalog models in BillableConfig.ready().
+    """
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        cache.set(CATALOG_GENERATION_KEY, 1, None)
+
+
+def _bump(key: str) -> None:
+    """Increments a version counter, creating it if missing or evicted."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _balance_version_key(user_id: int) -> str:
+    return f"billable:balance:version:{user_id}"
+
+
+def _balance_key(kind: str, user_id: int, versions: dict) -> str:
+    return (
+        f"billable:balance:{versions.get(BALANCE_GENERATION_KEY, 0)}:"
+        f"{user_id}:{versions.get(_balance_version_key(user_id), 0)}:{kind}"
+    )
+
+
+def balance_cache_key(kind: str, user_id: int) -> str:
+    """
+    Builds a cache key for a user's balance entry bound to its current versions.
+
+    Args:
+        kind: Entry type (e.g. "summary", "wallet").
+        user_id: Owner of the balance.
+
+    Returns:
+        str: Cache key that changes after every invalidation of the user's balance.
+    """
+    versions = cache.get_many([BALANCE_GENERATION_KEY, _balance_version_key(user_id)])
+    return _balance_key(kind, user_id, versions)
+
+
+async def abalance_cache_key(kind: str, user_id: int) -> str:
+    """Async variant of balance_cache_key."""
+    versions = await cache.aget_many([BALANCE_GENERATION_KEY, _balance_version_key(user_id)])
+    return _balance_key(kind, user_id, versions)
+
+
+def invalidate_user_balance(user_id: int) -> None:
+    """
+    Invalidates cached balance entries of one user.
+
+    Bumped now and again after the surrounding transaction commits, so a
+    concurrent reader cannot cache pre-commit data under the new version.
+    """
+    key = _balance_version_key(user_id)
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def invalidate_all_balances(**kwargs) -> None:
+    """
+    Invalidates cached balance entries of all users (bulk writes, product changes).
+
+    Also usable as a signal receiver.
+    """
+    _bump(BALANCE_GENERATION_KEY)
+    transaction.on_commit(lambda: _bump(BALANCE_GENERATION_KEY))
+
+
+def invalidate_batch_owner_balance(sender, instance, **kwargs) -> None:
+    """
+    Signal receiver: invalidates the balance of the batch owner.
+
+    Connected to post_save/post_delete of QuotaBatch in BillableConfig.ready().
+    """
+    invalidate_user_balance(instance.user_id)
@@ -4,36 +4,71 @@ This module provides a settings wrapper that allows setting default values
 if the user hasn't specified them in settings.py.
 """
 
+from functools import cached_property
+
 from django.conf import settings
+from django.core.signals import setting_changed
 
 
 class AppSettings:
     """
     Settings wrapper for accessing configuration.
     Allows setting default values if the user hasn't specified them in settings.py.
+
+    Values are resolved once per process and cached on the instance;
+    reload() drops the cache (called automatically on setting_changed).
     """
 
-    @property
+    @cached_property
     def API_TOKEN(self):
         return getattr(settings, "BILLABLE_API_TOKEN", None)
 
-    @property
+    @cached_property
     def USER_MODEL(self):
         return getattr(settings, "AUTH_USER_MODEL", "auth.User")
 
-    @property
+    @cached_property
     def TABLE_PREFIX(self):
         return "billable_"
 
-    @property
+    @cached_property
     def SHOW_DOCS(self):
         return getattr(settings, "BILLABLE_SHOW_DOCS", True)
-    
-    @property
+
+    @cached_property
     def API_TITLE(self):
         return getattr(settings, "BILLABLE_API_TITLE", "Billable Engine API")
 
+    @cached_property
+    def IDENTITY_TOKEN_MAX_AGE(self):
+        return getattr(settings, "BILLABLE_IDENTITY_TOKEN_MAX_AGE", 24 * 60 * 60)
+
+    @cached_property
+    def CATALOG_CACHE_TTL(self):
+        return getattr(settings, "BILLABLE_CATALOG_CACHE_TTL", 0)
+
+    @cached_property
+    def BALANCE_CACHE_TTL(self):
+        return getattr(settings, "BILLABLE_BALANCE_CACHE_TTL", 0)
+
+    @cached_property
+    def BULK_CREATE_BATCH_SIZE(self):
+        return getattr(settings, "BILLABLE_BULK_CREATE_BATCH_SIZE", 500)
+
+    def reload(self) -> None:
+        """Forget cached values so they are re-read from django.conf.settings."""
+        self.__dict__.clear()
+
 
 
 # Create singleton instance
 billable_settings = AppSettings()
+
+
+def _reload_billable_settings(*, setting: str, **kwargs) -> None:
+    """Keep override_settings working for cached values."""
+    if setting.startswith("BILLABLE_") or setting == "AUTH_USER_MODEL":
+        billable_settings.reload()
+
+
+setting_changed.connect(_reload_billable_settings)
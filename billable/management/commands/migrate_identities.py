@@ -2,15 +2,33 @@
 
 from __future__ import annotations
 
+import csv
+import io
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Any
 
+import django
 from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
 from django.core.management.base import BaseCommand, CommandParser
-from django.db import transaction
+from django.db import connection, connections, transaction
+from django.db.models import CharField, Exists, Field, Max, Min, OuterRef, QuerySet
+from django.db.models.functions import Cast, Trim
+from django.utils import timezone
 
 from billable.conf import billable_settings
 from billable.models import ExternalIdentity
 
+# Number of identities inserted per statement
+BATCH_SIZE = 1000
+# Number of identities loaded per COPY with --copy
+COPY_BATCH_SIZE = 50000
+# Number of users fetched per round-trip while streaming the user table
+USER_CHUNK_SIZE = 2000
+# Internal field types whose empty value ("") can be filtered in SQL
+TEXT_FIELD_TYPES = frozenset({"CharField", "TextField", "SlugField", "EmailField"})
+
 
 class Command(BaseCommand):
     """
@@ -49,12 +67,36 @@ class Command(BaseCommand):
             default=0,
             help="Limit the number of users to process (0 = no limit).",
         )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="PostgreSQL only: load identities with COPY via a temp table (fastest for very large tables).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes, each migrating its own PK range (not supported on SQLite).",
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         field: str = options["field"]
         provider: str = options["provider"]
         dry_run: bool = options["dry_run"]
         limit: int = options["limit"]
+        use_copy: bool = options["copy"]
+        workers: int = options["workers"]
+
+        if use_copy and connection.vendor != "postgresql":
+            self.stderr.write(self.style.ERROR("--copy is only supported on PostgreSQL."))
+            return
+        if workers > 1:
+            if dry_run or limit > 0:
+                self.stderr.write(self.style.ERROR("--workers cannot be combined with --dry-run or --limit."))
+                return
+            if connection.vendor == "sqlite":
+                self.stderr.write(self.style.ERROR("--workers is not supported on SQLite."))
+                return
 
         user_model_label: str = billable_settings.USER_MODEL
         try:
@@ -66,51 +108,319 @@ class Command(BaseCommand):
             )
             return
 
-        if not hasattr(UserModel, field):
+        try:
+            field_obj = UserModel._meta.get_field(field)
+        except FieldDoesNotExist:
             self.stderr.write(
                 self.style.ERROR(
                     f"Model {user_model_label} has no field '{field}'."
                 )
             )
             return
+        # Relations without a column (reverse FKs, M2M) cannot be read in one query
+        if not field_obj.concrete:
+            self.stderr.write(
+                self.style.ERROR(
+                    f"Field '{field}' of model {user_model_label} is not a concrete column."
+                )
+            )
+            return
+        # Column attribute name (e.g. "profile_id" for a FK)
+        attname = field_obj.attname
 
-        qs = UserModel.objects.all().order_by("pk")
+        # Users whose identifier already has an identity are filtered out by the
+        # database (NOT EXISTS), so reruns only stream the users still to migrate.
+        skipped = UserModel.objects.filter(_already_migrated(provider, attname)).count()
+
+        if workers > 1:
+            self._handle_parallel(UserModel, user_model_label, field, provider, workers, use_copy, skipped)
+            return
+
+        # Only (pk, identifier) tuples are needed; stream them instead of loading User instances
+        qs = _candidate_queryset(UserModel, field_obj, provider)
         if limit > 0:
             qs = qs[:limit]
 
+        # Users sharing an identifier are resolved by the unique constraint
+        # (ON CONFLICT DO NOTHING / ignore_conflicts), keeping memory constant.
+        # created counts rows actually inserted; queued counts rows sent.
         created = 0
-        skipped = 0
+        queued = 0
 
-        with transaction.atomic():
-            for user in qs:
-                value = getattr(user, field, None)
-                if value is None or (isinstance(value, str) and not value.strip()):
-                    continue
-                external_id = str(value).strip()
-
-                exists = ExternalIdentity.objects.filter(
-                    provider=provider,
-                    external_id=external_id,
-                ).exists()
-                if exists:
-                    skipped += 1
-                    continue
-
-                if dry_run:
-                    self.stdout.write(
-                        f"[DRY] Create identity provider={provider!r} external_id={external_id!r} user_id={user.pk}"
-                    )
-                    created += 1
-                else:
-                    ExternalIdentity.objects.create(
-                        provider=provider,
-                        external_id=external_id,
-                        user=user,
-                    )
-                    created += 1
+        # (external_id, user_id) rows waiting to be inserted
+        pending: list[tuple[str, int]] = []
+        # Dry-run lines, written in chunks of BATCH_SIZE instead of one write per user
+        dry_lines: list[str] = []
+        batch_size = COPY_BATCH_SIZE if use_copy else BATCH_SIZE
+
+        for external_id, user_id in _iter_identities(qs, field_obj):
+            queued += 1
+            if dry_run:
+                dry_lines.append(
+                    f"[DRY] Create identity provider={provider!r} external_id={external_id!r} user_id={user_id}"
+                )
+                created += 1
+                if len(dry_lines) >= BATCH_SIZE:
+                    self.stdout.write("\n".join(dry_lines))
+                    dry_lines.clear()
+            else:
+                pending.append((external_id, user_id))
+                if len(pending) >= batch_size:
+                    created += self._flush(provider, pending, use_copy)
+                    self.stdout.write(f"Committed {created} identities...")
+
+        if dry_lines:
+            self.stdout.write("\n".join(dry_lines))
+        created += self._flush(provider, pending, use_copy)
+        # Rows dropped by the unique constraint (shared or concurrently created identifiers)
+        skipped += queued - created
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Created: {created}, skipped (already exist): {skipped}."
+            )
+        )
+
+    def _handle_parallel(
+        self,
+        UserModel: type,
+        user_model_label: str,
+        field: str,
+        provider: str,
+        workers: int,
+        use_copy: bool,
+        skipped: int,
+    ) -> None:
+        """
+        Split the user table into equal PK ranges and migrate them in worker processes.
+
+        Ranges are disjoint, and identifiers shared across ranges are resolved by
+        the ON CONFLICT clause; each worker reports the rows it actually inserted.
+        """
+        bounds = UserModel.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+        lo, hi = bounds["lo"], bounds["hi"]
+        if lo is None:
+            self.stdout.write(self.style.SUCCESS(f"Done. Created: 0, skipped (already exist): {skipped}."))
+            return
+        if not isinstance(lo, int):
+            self.stderr.write(self.style.ERROR("--workers requires an integer primary key on the user model."))
+            return
+
+        step = (hi - lo) // workers + 1
+        ranges = [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+        # Forked workers must not share the parent's database sockets
+        connections.close_all()
+        processed = 0
+        created = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [
+                executor.submit(_migrate_pk_range, user_model_label, field, provider, range_lo, range_hi, use_copy)
+                for range_lo, range_hi in ranges
+            ]
+            for future in as_completed(futures):
+                range_processed, range_created = future.result()
+                processed += range_processed
+                created += range_created
+                self.stdout.write(f"Processed {processed} users...")
 
+        skipped += processed - created
         self.stdout.write(
             self.style.SUCCESS(
                 f"Done. Created: {created}, skipped (already exist): {skipped}."
             )
         )
+
+    @staticmethod
+    def _flush(provider: str, pending: list[tuple[str, int]], use_copy: bool = False) -> int:
+        """
+        Insert pending identities in their own transaction and clear the buffer.
+
+        Returns the number of rows actually inserted.
+
+        Conflicts on the (provider, external_id) unique constraint are ignored,
+        so identities created concurrently by the API are skipped, not duplicated.
+        PostgreSQL gets COPY (with use_copy) or a single raw multi-row INSERT;
+        other backends use bulk_create.
+        """
+        if not pending:
+            return 0
+        # Each batch commits on its own: a failure keeps earlier batches, and reruns are safe
+        with transaction.atomic():
+            if use_copy:
+                inserted = _copy_identities_postgresql(provider, pending)
+            elif connection.vendor == "postgresql":
+                inserted = _insert_identities_postgresql(provider, pending)
+            else:
+                # ignore_conflicts reports no count, so compare the batch's rows before and after
+                batch_qs = ExternalIdentity.objects.filter(
+                    provider=provider, external_id__in={external_id for external_id, _ in pending}
+                )
+                before = batch_qs.count()
+                ExternalIdentity.objects.bulk_create(
+                    [
+                        ExternalIdentity(provider=provider, external_id=external_id, user_id=user_id)
+                        for external_id, user_id in pending
+                    ],
+                    batch_size=BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+                inserted = batch_qs.count() - before
+        pending.clear()
+        return inserted
+
+
+def _already_migrated(provider: str, attname: str) -> Exists:
+    """
+    NOT EXISTS-able subquery: the user's identifier already has an identity for provider.
+
+    Compared trimmed, since text identifiers are stored stripped.
+    """
+    return Exists(
+        ExternalIdentity.objects.filter(
+            provider=provider,
+            external_id=Trim(Cast(OuterRef(attname), output_field=CharField())),
+        )
+    )
+
+
+def _candidate_queryset(UserModel: type, field_obj: Field, provider: str) -> QuerySet:
+    """
+    (pk, identifier) tuples of users not migrated yet, ordered by pk.
+
+    NULL identifiers (and empty strings for text fields) are excluded in SQL.
+    """
+    attname = field_obj.attname
+    qs = UserModel.objects.filter(~_already_migrated(provider, attname)).exclude(**{f"{attname}__isnull": True})
+    if field_obj.get_internal_type() in TEXT_FIELD_TYPES:
+        qs = qs.exclude(**{attname: ""})
+    return qs.values_list("pk", attname).order_by("pk")
+
+
+def _iter_identities(qs: QuerySet, field_obj: Field) -> Iterator[tuple[str, int]]:
+    """
+    Stream (external_id, user_id) pairs from a _candidate_queryset().
+
+    The conversion is picked once from the field type: text values are stripped
+    (whitespace-only ones skipped), other values only need str().
+    """
+    rows = qs.iterator(chunk_size=USER_CHUNK_SIZE)
+    if field_obj.get_internal_type() in TEXT_FIELD_TYPES:
+        for user_id, value in rows:
+            external_id = value.strip()
+            if external_id:
+                yield external_id, user_id
+    else:
+        for user_id, value in rows:
+            yield str(value), user_id
+
+
+def _init_worker() -> None:
+    """Set up Django in a worker process (no-op when the process was forked)."""
+    django.setup()
+
+
+def _migrate_pk_range(
+    user_model_label: str,
+    field: str,
+    provider: str,
+    lo: int,
+    hi: int,
+    use_copy: bool,
+) -> tuple[int, int]:
+    """
+    Migrate users with lo <= pk <= hi in a worker process.
+
+    Returns (non-empty identifiers processed, identities inserted) for the range.
+    """
+    UserModel = apps.get_model(user_model_label)
+    field_obj = UserModel._meta.get_field(field)
+    qs = _candidate_queryset(UserModel, field_obj, provider).filter(pk__range=(lo, hi))
+    batch_size = COPY_BATCH_SIZE if use_copy else BATCH_SIZE
+    processed = 0
+    inserted = 0
+    pending: list[tuple[str, int]] = []
+    try:
+        for row in _iter_identities(qs, field_obj):
+            processed += 1
+            pending.append(row)
+            if len(pending) >= batch_size:
+                inserted += Command._flush(provider, pending, use_copy)
+        inserted += Command._flush(provider, pending, use_copy)
+    finally:
+        connections.close_all()
+    return processed, inserted
+
+
+def _insert_identities_postgresql(provider: str, rows: list[tuple[str, int]]) -> int:
+    """
+    Insert identities with one INSERT ... ON CONFLICT DO NOTHING statement.
+
+    Returns the number of rows inserted (conflicting rows are not counted).
+
+    Skips model instantiation and bulk_create bookkeeping; column names are
+    taken from the model so db_table/db_column overrides are respected.
+    """
+    opts = ExternalIdentity._meta
+    qn = connection.ops.quote_name
+    columns = [
+        qn(opts.get_field(name).column)
+        for name in ("provider", "external_id", "user", "metadata", "created_at", "updated_at")
+    ]
+    row_sql = "(%s, %s, %s, '{}'::jsonb, %s, %s)"
+    sql = (
+        f"INSERT INTO {qn(opts.db_table)} ({', '.join(columns)}) "
+        f"VALUES {', '.join([row_sql] * len(rows))} "
+        f"ON CONFLICT ({columns[0]}, {columns[1]}) DO NOTHING"
+    )
+    now = timezone.now()
+    params = [
+        param
+        for external_id, user_id in rows
+        for param in (provider, external_id, user_id, now, now)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _copy_identities_postgresql(provider: str, rows: list[tuple[str, int]]) -> int:
+    """
+    Load identities with COPY into a temp table, then INSERT ... SELECT.
+
+    Returns the number of rows inserted (conflicting rows are not counted).
+
+    Must run inside a transaction: the temp table is dropped on commit. Inside
+    an outer transaction each batch is a savepoint and the table outlives it,
+    so it is created only if missing and truncated before every load.
+    Supports both psycopg 3 (cursor.copy) and psycopg2 (copy_expert with CSV).
+    """
+    opts = ExternalIdentity._meta
+    qn = connection.ops.quote_name
+    columns = [
+        qn(opts.get_field(name).column)
+        for name in ("provider", "external_id", "user", "metadata", "created_at", "updated_at")
+    ]
+    copy_sql = "COPY billable_tmp_identities (external_id, user_id) FROM STDIN"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS billable_tmp_identities (external_id text, user_id bigint) ON COMMIT DROP"
+        )
+        cursor.execute("TRUNCATE billable_tmp_identities")
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy"):
+            with raw_cursor.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            raw_cursor.copy_expert(f"{copy_sql} WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {qn(opts.db_table)} ({', '.join(columns)}) "
+            f"SELECT %s, external_id, user_id, '{{}}'::jsonb, %s, %s FROM billable_tmp_identities "
+            f"ON CONFLICT ({columns[0]}, {columns[1]}) DO NOTHING",
+            [provider, timezone.now(), timezone.now()],
+        )
+        return cursor.rowcount
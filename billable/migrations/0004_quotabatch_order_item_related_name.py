@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-16 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0003_transaction_user_created_desc_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="quotabatch",
+            name="order_item",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="quota_batches",
+                to="billable.orderitem",
+                verbose_name="Order Item",
+            ),
+        ),
+    ]
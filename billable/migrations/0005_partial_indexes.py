@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-16 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0004_quotabatch_order_item_related_name"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="quotabatch",
+            name="billable_qb_user_prod_state",
+        ),
+        migrations.AddIndex(
+            model_name="quotabatch",
+            index=models.Index(
+                condition=models.Q(("state", "ACTIVE")),
+                fields=["user", "product"],
+                name="billable_qb_user_prod_active",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="referral",
+            name="billable_ref_bonus_granted_idx",
+        ),
+        migrations.AddIndex(
+            model_name="referral",
+            index=models.Index(
+                condition=models.Q(("bonus_granted", False)),
+                fields=["bonus_granted"],
+                name="billable_ref_bonus_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-16 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0005_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="externalidentity",
+            name="billable_extid_provider_idx",
+        ),
+        migrations.AlterField(
+            model_name="externalidentity",
+            name="provider",
+            field=models.CharField(blank=True, default="default", help_text="Identity source/provider name (e.g., 'telegram', 'max', 'n8n')", max_length=50, verbose_name="Provider"),
+        ),
+        migrations.AlterField(
+            model_name="externalidentity",
+            name="external_id",
+            field=models.CharField(help_text="Stable external identifier within the provider scope", max_length=255, verbose_name="External ID"),
+        ),
+        migrations.RemoveIndex(
+            model_name="trialhistory",
+            name="billable_trial_identity_idx",
+        ),
+        migrations.AlterField(
+            model_name="trialhistory",
+            name="identity_type",
+            field=models.CharField(help_text="Type of identifier (e.g., 'external_id', 'hh', 'email', 'fingerprint')", max_length=50, verbose_name="Identity Type"),
+        ),
+        migrations.AlterField(
+            model_name="trialhistory",
+            name="identity_hash",
+            field=models.CharField(help_text="SHA-256 hash of the normalized identifier value for privacy", max_length=64, verbose_name="Identity Hash"),
+        ),
+    ]
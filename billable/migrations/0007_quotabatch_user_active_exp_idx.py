@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-16 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0006_drop_redundant_identity_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="quotabatch",
+            index=models.Index(
+                condition=models.Q(("state", "ACTIVE")),
+                fields=["user", "expires_at"],
+                name="billable_qb_user_active_exp",
+            ),
+        ),
+    ]
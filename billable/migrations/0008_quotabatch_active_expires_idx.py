@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-16 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0007_quotabatch_user_active_exp_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="quotabatch",
+            name="billable_qb_expires_at_idx",
+        ),
+        migrations.AddIndex(
+            model_name="quotabatch",
+            index=models.Index(
+                condition=models.Q(("state", "ACTIVE")),
+                fields=["expires_at"],
+                name="billable_qb_active_expires_idx",
+            ),
+        ),
+    ]
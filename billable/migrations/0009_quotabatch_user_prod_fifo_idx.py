@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0008_quotabatch_active_expires_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="quotabatch",
+            name="billable_qb_user_prod_active",
+        ),
+        migrations.AddIndex(
+            model_name="quotabatch",
+            index=models.Index(
+                condition=models.Q(("state", "ACTIVE")),
+                fields=["user", "product", "created_at"],
+                name="billable_qb_user_prod_fifo",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-16 12:20
+
+from django.db import migrations, models
+
+
+def backfill_idempotency_keys(apps, schema_editor):
+    """Copies metadata["idempotency_key"] to the column on the newest transaction per key."""
+    Transaction = apps.get_model("billable", "Transaction")
+    seen = set()
+    to_update = []
+    txs = (
+        Transaction.objects.filter(metadata__has_key="idempotency_key")
+        .order_by("-created_at", "-id")
+        .only("id", "user_id", "action_type", "metadata")
+    )
+    for tx in txs.iterator():
+        key = tx.metadata.get("idempotency_key")
+        if not key:
+            continue
+        key = str(key)[:255]
+        if (tx.user_id, tx.action_type, key) in seen:
+            continue
+        seen.add((tx.user_id, tx.action_type, key))
+        tx.idempotency_key = key
+        to_update.append(tx)
+    Transaction.objects.bulk_update(to_update, ["idempotency_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billable", "0009_quotabatch_user_prod_fifo_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="consume_quota key; set on the last DEBIT transaction of a consumption.",
+                max_length=255,
+                null=True,
+                verbose_name="Idempotency Key",
+            ),
+        ),
+        migrations.RunPython(backfill_idempotency_keys, reverse_code=migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("idempotency_key__isnull", False)),
+                fields=("user", "action_type", "idempotency_key"),
+                name="billable_tx_idempotency_uniq",
+            ),
+        ),
+    ]
@@ -8,14 +8,82 @@ from __future__ import annotations
 
 import hashlib
 import uuid
+from functools import lru_cache
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import Upper
 from django.utils import timezone
 
+from .cache import invalidate_catalog
 from .conf import billable_settings
 
+# Resolved once; every user FK below points at the same model label
+USER_MODEL = billable_settings.USER_MODEL
+
+
+def _namespace_taken(model: type[models.Model], field: str, value: str) -> bool:
+    """
+    Check the shared Product Key / Offer SKU namespace with one unique-index probe.
+
+    Keys are stored uppercase, so the value is normalized the same way save() does.
+    """
+    return model._default_manager.filter(**{field: value.upper()}).exists()
+
+
+def _upper(value):
+    """Uppercase a plain string in Python, or an expression in SQL."""
+    if isinstance(value, str):
+        return value.upper()
+    return Upper(value)
+
+
+_MISSING = object()
+
+
+def _bulk_insert_dicts(queryset: models.QuerySet, rows: list[dict], key_field: str, batch_size: int | None) -> int:
+    """
+    Insert plain dicts with executemany, without instantiating model objects.
+
+    Missing fields get their model default (auto_now/auto_now_add get the current
+    time); key_field is normalized to uppercase. No signals are sent and no
+    validation is run, so callers are responsible for clean data.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    fields = [f for f in model._meta.concrete_fields if not isinstance(f, models.AutoField)]
+    now = timezone.now()
+
+    params = []
+    for row in rows:
+        values = []
+        for field in fields:
+            value = row.get(field.attname, row.get(field.name, _MISSING))
+            if value is _MISSING:
+                if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+                    value = now
+                else:
+                    value = field.get_default()
+            if field.name == key_field and value:
+                value = value.upper()
+            values.append(field.get_db_prep_save(value, connection))
+        params.append(values)
+
+    qn = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    batch_size = batch_size or billable_settings.BULK_CREATE_BATCH_SIZE
+    with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+        for start in range(0, len(params), batch_size):
+            cursor.executemany(sql, params[start:start + batch_size])
+
+    # No post_save is sent, so drop cached catalog entries explicitly
+    invalidate_catalog()
+    return len(params)
+
 
 class ProductQuerySet(models.QuerySet):
     """
@@ -25,19 +93,34 @@ class ProductQuerySet(models.QuerySet):
     def update(self, **kwargs) -> int:
         """
         Normalize product_key to uppercase before updating.
+        Expressions (e.g. F("name")) are uppercased in SQL.
         """
         if 'product_key' in kwargs and kwargs['product_key']:
-            kwargs['product_key'] = kwargs['product_key'].upper()
+            kwargs['product_key'] = _upper(kwargs['product_key'])
         return super().update(**kwargs)
 
     def bulk_create(self, objs, batch_size=None, ignore_conflicts=False) -> list[Product]:
         """
         Normalize product_key to uppercase for all objects before bulk creation.
+        Rows are inserted in chunks of BILLABLE_BULK_CREATE_BATCH_SIZE unless batch_size is given.
         """
         for obj in objs:
             if obj.product_key:
                 obj.product_key = obj.product_key.upper()
-        return super().bulk_create(objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+        return super().bulk_create(
+            objs,
+            batch_size=batch_size or billable_settings.BULK_CREATE_BATCH_SIZE,
+            ignore_conflicts=ignore_conflicts,
+        )
+
+    def bulk_create_dicts(self, rows: list[dict], batch_size: int | None = None) -> int:
+        """
+        Insert Products from plain dicts (field name -> value) in executemany batches.
+
+        Faster than bulk_create() for large imports because no model instances
+        are built; product_key is still normalized to uppercase. Returns the row count.
+        """
+        return _bulk_insert_dicts(self, rows, "product_key", batch_size)
 
 
 class OfferQuerySet(models.QuerySet):
@@ -48,19 +131,34 @@ class OfferQuerySet(models.QuerySet):
     def update(self, **kwargs) -> int:
         """
         Normalize SKU to uppercase before updating.
+        Expressions (e.g. F("name")) are uppercased in SQL.
         """
         if 'sku' in kwargs and kwargs['sku']:
-            kwargs['sku'] = kwargs['sku'].upper()
+            kwargs['sku'] = _upper(kwargs['sku'])
         return super().update(**kwargs)
 
     def bulk_create(self, objs, batch_size=None, ignore_conflicts=False) -> list[Offer]:
         """
         Normalize SKU to uppercase for all objects before bulk creation.
+        Rows are inserted in chunks of BILLABLE_BULK_CREATE_BATCH_SIZE unless batch_size is given.
         """
         for obj in objs:
             if obj.sku:
                 obj.sku = obj.sku.upper()
-        return super().bulk_create(objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+        return super().bulk_create(
+            objs,
+            batch_size=batch_size or billable_settings.BULK_CREATE_BATCH_SIZE,
+            ignore_conflicts=ignore_conflicts,
+        )
+
+    def bulk_create_dicts(self, rows: list[dict], batch_size: int | None = None) -> int:
+        """
+        Insert Offers from plain dicts (field name -> value) in executemany batches.
+
+        Faster than bulk_create() for large imports because no model instances
+        are built; SKU is still normalized to uppercase. Returns the row count.
+        """
+        return _bulk_insert_dicts(self, rows, "sku", batch_size)
 
 
 class Product(models.Model):
@@ -124,7 +222,7 @@ class Product(models.Model):
         Validate shared namespace: product_key must not exist as an Offer SKU.
         """
         if self.product_key:
-            if Offer.objects.filter(sku=self.product_key).exists():
+            if _namespace_taken(Offer, "sku", self.product_key):
                 raise ValidationError(
                     {"product_key": f"Conflict: '{self.product_key}' is already used as an Offer SKU."}
                 )
@@ -134,7 +232,7 @@ class Product(models.Model):
         """
         Normalize product_key to uppercase before saving.
         """
-        if self.product_key:
+        if self.product_key and not self.product_key.isupper():
             self.product_key = self.product_key.upper()
         super().save(*args, **kwargs)
 
@@ -188,7 +286,7 @@ class Offer(models.Model):
         Validate shared namespace: SKU must not exist as a Product Key.
         """
         if self.sku:
-            if Product.objects.filter(product_key=self.sku).exists():
+            if _namespace_taken(Product, "product_key", self.sku):
                 raise ValidationError(
                     {"sku": f"Conflict: '{self.sku}' is already used as a Product Key."}
                 )
@@ -198,7 +296,7 @@ class Offer(models.Model):
         """
         Normalize SKU to uppercase before saving.
         """
-        if self.sku:
+        if self.sku and not self.sku.isupper():
             self.sku = self.sku.upper()
         super().save(*args, **kwargs)
 
@@ -257,6 +355,24 @@ class OfferItem(models.Model):
     def __str__(self) -> str:
         return f"{self.offer.name} -> {self.product.name} x{self.quantity}"
 
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for Order model with relation-loading helpers.
+    """
+
+    def with_items(self) -> OrderQuerySet:
+        """
+        Prefetch order items together with their offers.
+
+        Iterating order.items.all() and item.offer then costs two extra queries
+        for the whole result set instead of 1+N per order.
+        """
+        return self.prefetch_related(
+            models.Prefetch("items", queryset=OrderItem.objects.select_related("offer"))
+        )
+
+
 class Order(models.Model):
     """
     User order for purchasing products.
@@ -272,7 +388,7 @@ class Order(models.Model):
 
     # User relationship
     user = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.CASCADE,
         verbose_name="User",
     )
@@ -329,6 +445,8 @@ class Order(models.Model):
         verbose_name="Payment Date",
     )
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         db_table = "billable_orders"
         verbose_name = "Order"
@@ -375,10 +493,14 @@ class Order(models.Model):
         """
         Gets all offers in the order.
         
+        Uses prefetched items when available, otherwise a single Offer query.
+
         Returns:
             list[Offer]: List of all offers in the order.
         """
-        return [item.offer for item in self.items.all() if item.offer]
+        if "items" in getattr(self, "_prefetched_objects_cache", {}):
+            return [item.offer for item in self.items.all() if item.offer_id]
+        return list(Offer.objects.filter(orderitem__order_id=self.pk).order_by("orderitem__id"))
 
     def get_first_offer(self) -> Offer | None:
         """
@@ -437,8 +559,14 @@ class OrderItem(models.Model):
     def get_quota_batches(self):
         """
         Gets quota batches associated with an order item.
+
+        Reuses batches prefetched via
+        Prefetch("items__quota_batches", queryset=QuotaBatch.objects.select_related("user", "product"))
+        instead of issuing a query per item.
         """
-        return QuotaBatch.objects.filter(order_item=self).select_related("user", "product")
+        if "quota_batches" in getattr(self, "_prefetched_objects_cache", {}):
+            return self.quota_batches.all()
+        return self.quota_batches.select_related("user", "product")
 
 
 class QuotaBatch(models.Model):
@@ -454,7 +582,7 @@ class QuotaBatch(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid7, editable=False)
     user = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.CASCADE,
         related_name="quota_batches",
         verbose_name="User",
@@ -477,6 +605,7 @@ class QuotaBatch(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        related_name="quota_batches",
         verbose_name="Order Item",
     )
 
@@ -500,8 +629,25 @@ class QuotaBatch(models.Model):
         verbose_name_plural = "Quota Batches"
         ordering = ["created_at"]
         indexes = [
-            models.Index(fields=["user", "product", "state"], name="billable_qb_user_prod_state"),
-            models.Index(fields=["expires_at"], name="billable_qb_expires_at_idx"),
+            # Balance reads only ever look at active batches; created_at serves
+            # the FIFO order of consume_quota from the same index
+            models.Index(
+                fields=["user", "product", "created_at"],
+                name="billable_qb_user_prod_fifo",
+                condition=models.Q(state="ACTIVE"),
+            ),
+            # get_user_active_products: user's active, non-expired batches
+            models.Index(
+                fields=["user", "expires_at"],
+                name="billable_qb_user_active_exp",
+                condition=models.Q(state="ACTIVE"),
+            ),
+            # expire_batches: active batches past their expiry
+            models.Index(
+                fields=["expires_at"],
+                name="billable_qb_active_expires_idx",
+                condition=models.Q(state="ACTIVE"),
+            ),
         ]
 
     def __str__(self) -> str:
@@ -519,7 +665,7 @@ class Transaction(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid7, editable=False)
     user = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.CASCADE,
         related_name="billable_transactions",
         verbose_name="User",
@@ -553,6 +699,14 @@ class Transaction(models.Model):
     object_id = models.CharField(max_length=255, null=True, blank=True)
     related_object = GenericForeignKey("content_type", "object_id")
 
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name="Idempotency Key",
+        help_text="consume_quota key; set on the last DEBIT transaction of a consumption.",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Metadata")
 
@@ -562,13 +716,46 @@ class Transaction(models.Model):
         verbose_name_plural = "Transactions"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["user", "created_at"], name="billable_tx_user_created_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="billable_tx_user_created_desc"),
             models.Index(fields=["action_type"], name="billable_tx_action_type_idx"),
         ]
+        # Serves the consume_quota idempotency lookup and rejects concurrent duplicates
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "action_type", "idempotency_key"],
+                condition=models.Q(idempotency_key__isnull=False),
+                name="billable_tx_idempotency_uniq",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.direction} {self.amount} - {self.action_type} ({self.user_id})"
 
+
+def _pairs_q(fields: tuple[str, str], pairs: list[tuple]) -> models.Q:
+    """
+    Builds `Q(field_a=a, field_b=b) | ...` matching any of the given pairs.
+
+    Each term is an equality on both columns of a composite index, which the
+    planner answers with one index probe per pair.
+    """
+    condition = models.Q()
+    for value_a, value_b in pairs:
+        condition |= models.Q(**{fields[0]: value_a, fields[1]: value_b})
+    return condition
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _hash_identity(value: str | int) -> str:
+    """
+    SHA-256 of the normalized identity value.
+
+    Memoized: the same identifier is checked repeatedly on signup/trial retries
+    and webhook redeliveries. typed=True keeps True and 1 apart.
+    """
+    return hashlib.sha256(str(value).strip().lower().encode()).hexdigest()
+
+
 class TrialHistory(models.Model):
     """
     Model for tracking users who have already used a free trial.
@@ -579,13 +766,11 @@ class TrialHistory(models.Model):
 
     identity_type = models.CharField(
         max_length=50,
-        db_index=True,
         verbose_name="Identity Type",
         help_text="Type of identifier (e.g., 'external_id', 'hh', 'email', 'fingerprint')",
     )
     identity_hash = models.CharField(
         max_length=64,
-        db_index=True,
         verbose_name="Identity Hash",
         help_text="SHA-256 hash of the normalized identifier value for privacy",
     )
@@ -610,10 +795,8 @@ class TrialHistory(models.Model):
         verbose_name = "Trial history"
         verbose_name_plural = "Trial histories"
         ordering = ["-used_at"]
+        # The unique index also serves (identity_type, identity_hash) lookups
         unique_together = ["identity_type", "identity_hash"]
-        indexes = [
-            models.Index(fields=["identity_type", "identity_hash"], name="billable_trial_identity_idx"),
-        ]
 
     def __str__(self) -> str:
         """
@@ -637,20 +820,34 @@ class TrialHistory(models.Model):
         """
         if value is None:
             return ""
-        normalized = str(value).strip().lower()
-        return hashlib.sha256(normalized.encode()).hexdigest()
+        return _hash_identity(value)
 
-    @classmethod
-    def has_used_trial(cls, identities: dict[str, str | int | None] | None = None, **kwargs) -> bool:
+    @staticmethod
+    def generate_identity_hashes(values: list[str | int | None]) -> list[str]:
         """
-        Checks if the user has used a trial before.
+        Batch variant of generate_identity_hash for many values at once.
 
         Args:
-            identities: Dictionary of {identity_type: identity_value}.
-            **kwargs: Backward compatibility for telegram_id, hh_id.
+            values: Identity values to hash.
 
         Returns:
-            bool: True if any identity matches a record in TrialHistory, False otherwise.
+            list[str]: Hashes in input order ("" for None values).
+        """
+        return [_hash_identity(value) if value is not None else "" for value in values]
+
+    @classmethod
+    def _identity_queryset(
+        cls, identities: dict[str, str | int | None] | None, kwargs: dict
+    ) -> models.QuerySet | None:
+        """
+        Builds the TrialHistory lookup shared by has_used_trial and ahas_used_trial.
+
+        Several identities are matched in one query as OR'ed
+        (identity_type, identity_hash) equality pairs, each answered by the
+        unique index on those columns.
+
+        Returns:
+            QuerySet | None: Matching records, or None if there is nothing to check.
         """
         ids_to_check = identities.copy() if identities else {}
         for key in ["telegram_id", "hh_id"]:
@@ -658,19 +855,31 @@ class TrialHistory(models.Model):
                 type_name = key.replace("_id", "")
                 ids_to_check[type_name] = kwargs[key]
 
-        if not ids_to_check:
-            return False
+        id_types = [id_type for id_type, id_value in ids_to_check.items() if id_value]
+        id_hashes = cls.generate_identity_hashes([ids_to_check[id_type] for id_type in id_types])
+        pairs = list(zip(id_types, id_hashes))
+        if not pairs:
+            return None
+        if len(pairs) == 1:
+            id_type, id_hash = pairs[0]
+            return cls.objects.filter(identity_type=id_type, identity_hash=id_hash)
 
-        lookups = models.Q()
-        for id_type, id_value in ids_to_check.items():
-            if id_value:
-                id_hash = cls.generate_identity_hash(id_value)
-                lookups |= models.Q(identity_type=id_type, identity_hash=id_hash)
+        return cls.objects.filter(_pairs_q(("identity_type", "identity_hash"), pairs))
 
-        if not lookups:
-            return False
+    @classmethod
+    def has_used_trial(cls, identities: dict[str, str | int | None] | None = None, **kwargs) -> bool:
+        """
+        Checks if the user has used a trial before.
+
+        Args:
+            identities: Dictionary of {identity_type: identity_value}.
+            **kwargs: Backward compatibility for telegram_id, hh_id.
 
-        return cls.objects.filter(lookups).exists()
+        Returns:
+            bool: True if any identity matches a record in TrialHistory, False otherwise.
+        """
+        qs = cls._identity_queryset(identities, kwargs)
+        return qs is not None and qs.exists()
 
     @classmethod
     async def ahas_used_trial(cls, identities: dict[str, str | int | None] | None = None, **kwargs) -> bool:
@@ -684,25 +893,8 @@ class TrialHistory(models.Model):
         Returns:
             bool: True if any identity matches a record in TrialHistory, False otherwise.
         """
-        ids_to_check = identities.copy() if identities else {}
-        for key in ["telegram_id", "hh_id"]:
-            if key in kwargs and kwargs[key]:
-                type_name = key.replace("_id", "")
-                ids_to_check[type_name] = kwargs[key]
-
-        if not ids_to_check:
-            return False
-
-        lookups = models.Q()
-        for id_type, id_value in ids_to_check.items():
-            if id_value:
-                id_hash = cls.generate_identity_hash(id_value)
-                lookups |= models.Q(identity_type=id_type, identity_hash=id_hash)
-
-        if not lookups:
-            return False
-
-        return await cls.objects.filter(lookups).aexists()
+        qs = cls._identity_queryset(identities, kwargs)
+        return qs is not None and await qs.aexists()
 
 
 class ExternalIdentity(models.Model):
@@ -719,19 +911,17 @@ class ExternalIdentity(models.Model):
     provider = models.CharField(
         max_length=50,
         default="default",
-        db_index=True,
         blank=True,
         verbose_name="Provider",
         help_text="Identity source/provider name (e.g., 'telegram', 'max', 'n8n')",
     )
     external_id = models.CharField(
         max_length=255,
-        db_index=True,
         verbose_name="External ID",
         help_text="Stable external identifier within the provider scope",
     )
     user = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
@@ -764,8 +954,8 @@ class ExternalIdentity(models.Model):
                 name="billable_extid_provider_external_id_uniq",
             ),
         ]
+        # The unique constraint's index (provider first) serves provider lookups
         indexes = [
-            models.Index(fields=["provider"], name="billable_extid_provider_idx"),
             models.Index(fields=["external_id"], name="billable_extid_external_id_idx"),
             models.Index(fields=["user"], name="billable_extid_user_idx"),
         ]
@@ -822,6 +1012,65 @@ class ExternalIdentity(models.Model):
         )
         return identity.user if identity else None
 
+    @classmethod
+    def _identities_queryset(cls, pairs: list[tuple[str, str | int]]) -> models.QuerySet:
+        """
+        Builds the lookup shared by get_users_by_identities and aget_users_by_identities.
+
+        Args:
+            pairs: Normalized (provider, external_id) pairs.
+
+        Returns:
+            QuerySet: Matching identities with users loaded.
+        """
+        return cls.objects.select_related("user").filter(_pairs_q(("provider", "external_id"), pairs))
+
+    @classmethod
+    def get_users_by_identities(
+        cls, pairs: list[tuple[str, str | int]]
+    ) -> dict[tuple[str, str], billable_settings.USER_MODEL | None]:
+        """
+        Retrieves users for many (provider, external_id) pairs in one query.
+
+        Args:
+            pairs: List of (provider, external_id) tuples.
+
+        Returns:
+            dict: {(provider, str(external_id)): User or None} for every requested pair.
+
+        Example:
+            users = ExternalIdentity.get_users_by_identities([("telegram", 1), ("telegram", 2)])
+        """
+        keys = list(dict.fromkeys((provider, str(external_id)) for provider, external_id in pairs))
+        result = dict.fromkeys(keys)
+        if keys:
+            for identity in cls._identities_queryset(keys):
+                result[(identity.provider, identity.external_id)] = identity.user
+        return result
+
+    @classmethod
+    async def aget_users_by_identities(
+        cls, pairs: list[tuple[str, str | int]]
+    ) -> dict[tuple[str, str], billable_settings.USER_MODEL | None]:
+        """
+        Asynchronously retrieves users for many (provider, external_id) pairs in one query.
+
+        Args:
+            pairs: List of (provider, external_id) tuples.
+
+        Returns:
+            dict: {(provider, str(external_id)): User or None} for every requested pair.
+
+        Example:
+            users = await ExternalIdentity.aget_users_by_identities([("telegram", 1), ("telegram", 2)])
+        """
+        keys = list(dict.fromkeys((provider, str(external_id)) for provider, external_id in pairs))
+        result = dict.fromkeys(keys)
+        if keys:
+            async for identity in cls._identities_queryset(keys):
+                result[(identity.provider, identity.external_id)] = identity.user
+        return result
+
     @classmethod
     def get_external_id_for_user(
         cls,
@@ -884,14 +1133,14 @@ class Referral(models.Model):
     """
 
     referrer = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.CASCADE,
         related_name="referrals_made",
         verbose_name="Inviter",
         help_text="User who invited another user",
     )
     referee = models.ForeignKey(
-        billable_settings.USER_MODEL,
+        USER_MODEL,
         on_delete=models.CASCADE,
         related_name="referrals_received",
         verbose_name="Invitee",
@@ -929,7 +1178,11 @@ class Referral(models.Model):
         indexes = [
             models.Index(fields=["referrer"], name="billable_ref_referrer_idx"),
             models.Index(fields=["referee"], name="billable_ref_referee_idx"),
-            models.Index(fields=["bonus_granted"], name="billable_ref_bonus_granted_idx"),
+            models.Index(
+                fields=["bonus_granted"],
+                name="billable_ref_bonus_pending_idx",
+                condition=models.Q(bonus_granted=False),
+            ),
             models.Index(fields=["created_at"], name="billable_ref_created_at_idx"),
         ]
 
@@ -947,15 +1200,16 @@ class Referral(models.Model):
                   False if it was already granted.
         """
         # Atomic update to prevent race conditions
+        now = timezone.now()
         rows = Referral.objects.filter(pk=self.pk, bonus_granted=False).update(
-            bonus_granted=True, 
-            bonus_granted_at=timezone.now()
+            bonus_granted=True,
+            bonus_granted_at=now,
         )
-        
+
         if rows > 0:
-            # Update local instance to reflect DB change
+            # Update local instance with the exact value written to the DB
             self.bonus_granted = True
-            self.bonus_granted_at = timezone.now()
+            self.bonus_granted_at = now
             return True
         return False
 
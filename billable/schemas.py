@@ -12,16 +12,17 @@ from decimal import Decimal
 from typing import Any, List, Dict
 from uuid import UUID
 
-from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
+from pydantic import AliasChoices, AliasPath, BaseModel, Field, ConfigDict, computed_field, field_validator
 
 
 class BaseSchema(BaseModel):
     """Base schema with ORM/Django model support.
 
     Enables population from Django model instances via from_attributes.
+    Instances are frozen: response schemas are built once and only serialized.
     """
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class ProductSchema(BaseSchema):
@@ -51,24 +52,20 @@ class ActiveBatchSchema(BaseSchema):
     purchased_at: datetime = Field(..., validation_alias="created_at", description="When the batch was created (grant time).")
     expires_at: datetime | None = Field(None, description="Optional expiration; null means no expiry.")
     total_quantity: int = Field(..., validation_alias="initial_quantity", description="Original quantity granted.")
-    used_quantity: int = Field(0, description="Quantity already consumed from this batch.")
-    is_active: bool = Field(True, description="True if batch is ACTIVE and can be consumed.")
     remaining: int | None = Field(None, validation_alias="remaining_quantity", description="Remaining quantity in this batch.")
+    state: str = Field("ACTIVE", exclude=True, description="Batch state; exposed as is_active.")
 
-    @model_validator(mode="before")
-    @classmethod
-    def calculate_fields(cls, data: Any) -> Any:
-        if hasattr(data, "initial_quantity") and hasattr(data, "remaining_quantity"):
-            # Model instance
-            data.used_quantity = data.initial_quantity - data.remaining_quantity
-            from .models import QuotaBatch
-            data.is_active = (data.state == QuotaBatch.State.ACTIVE)
-        elif isinstance(data, dict):
-            if "initial_quantity" in data and "remaining_quantity" in data:
-                data["used_quantity"] = data["initial_quantity"] - data["remaining_quantity"]
-            if "state" in data:
-                data["is_active"] = (data["state"] == "ACTIVE")
-        return data
+    @computed_field(description="Quantity already consumed from this batch.")
+    @property
+    def used_quantity(self) -> int:
+        if self.remaining is None:
+            return 0
+        return self.total_quantity - self.remaining
+
+    @computed_field(description="True if batch is ACTIVE and can be consumed.")
+    @property
+    def is_active(self) -> bool:
+        return self.state == "ACTIVE"
 
 
 class OfferItemSchema(BaseSchema):
@@ -148,29 +145,15 @@ class OrderItemSchema(BaseSchema):
     """Single line item within an order: one offer and quantity at a fixed price."""
 
     id: int = Field(..., description="Order item primary key.")
-    sku: str = Field(..., alias="offer_sku", description="Offer SKU (e.g. off_diamonds_100).")
+    sku: str = Field(
+        ...,
+        validation_alias=AliasChoices("offer_sku", "sku", AliasPath("offer", "sku")),
+        serialization_alias="offer_sku",
+        description="Offer SKU (e.g. off_diamonds_100).",
+    )
     quantity: int = Field(..., description="Number of offers purchased.")
     price: Decimal = Field(..., description="Price per offer at the moment of purchase.")
 
-    @model_validator(mode="before")
-    @classmethod
-    def extract_order_item_data(cls, data: Any) -> Any:
-        """Simple mapping from OrderItem model or dict."""
-        if isinstance(data, dict):
-            # Support both 'sku' and 'offer_sku' in dicts
-            if "offer_sku" not in data and "sku" in data:
-                data["offer_sku"] = data["sku"]
-            return data
-        
-        if hasattr(data, "offer") and data.offer:
-            return {
-                "id": data.id,
-                "offer_sku": data.offer.sku,
-                "quantity": data.quantity,
-                "price": data.price,
-            }
-        return data
-
 
 class OrderSchema(BaseSchema):
     """Order: a financial intent (cart) with status and line items.
@@ -202,6 +185,7 @@ class OrderCreateSchema(BaseModel):
     user_id: int | None = Field(None, description="Local billing user ID; required if external_id not provided.")
     external_id: str | None = Field(None, description="External identifier (e.g. telegram chat id); used with provider.")
     provider: str | None = Field(None, description="Identity provider (e.g. telegram, n8n). Defaults to 'default'.")
+    identity_token: str | None = Field(None, description="Signed token from POST /identify; resolves the user by identity primary key.")
     items: list[dict[str, Any]] = Field(..., description="List of {sku: str, quantity: int}. SKU is automatically normalized to uppercase. At least one item required.")
     metadata: dict[str, Any] | None = Field(None, description="Optional application-specific payload (e.g. report_id).")
 
@@ -244,10 +228,11 @@ class QuotaConsumeSchema(BaseModel):
     user_id: int | None = Field(None, description="Local billing user ID; required if external_id not provided.")
     external_id: str | None = Field(None, description="External identifier; used with provider to resolve user.")
     provider: str | None = Field(None, description="Identity provider. Defaults to 'default'.")
+    identity_token: str | None = Field(None, description="Signed token from POST /identify; resolves the user by identity primary key.")
     product_key: str = Field(..., description="Product key to consume (e.g. PDF_EXPORT, DIAMONDS). Automatically normalized to uppercase.")
     action_type: str = Field(..., description="Reason for consumption (e.g. usage, admin_adjustment).")
     action_id: str | None = Field(None, description="Optional external reference (e.g. report_id).")
-    idempotency_key: str | None = Field(None, description="Optional key to prevent duplicate consumption for same action.")
+    idempotency_key: str | None = Field(None, max_length=255, description="Optional key to prevent duplicate consumption for same action.")
     metadata: dict[str, Any] | None = Field(None, description="Optional context (JSON).")
 
 
@@ -273,6 +258,7 @@ class TrialGrantSchema(BaseModel):
     user_id: int | None = Field(None, description="Local billing user ID; required if external_id not provided.")
     external_id: str | None = Field(None, description="External identifier; used with provider.")
     provider: str | None = Field(None, description="Identity provider. Defaults to 'default'.")
+    identity_token: str | None = Field(None, description="Signed token from POST /identify; resolves the user by identity primary key.")
     identities: dict[str, str | int] | None = Field(
         None,
         description="Optional identity map for TrialHistory; e.g. {'telegram': 5454776146}.",
@@ -312,6 +298,7 @@ class IdentifySchemaOut(BaseModel):
     created_user: bool = Field(..., description="True if User was just created.")
     trial_eligible: bool = Field(..., description="True if TrialHistory has not recorded a trial for this identity.")
     metadata: dict[str, Any] = Field(..., description="Identity metadata (e.g. profile).")
+    identity_token: str = Field(..., description="Signed token embedding the identity id; pass as identity_token in POST bodies instead of external_id + provider.")
 
 
 class ReferralAssignSchema(BaseModel):
@@ -348,6 +335,7 @@ class ExchangeSchema(BaseModel):
     user_id: int | None = Field(None, description="Local billing user ID; required if external_id not provided.")
     external_id: str | None = Field(None, description="External identifier; used with provider.")
     provider: str | None = Field(None, description="Identity provider. Defaults to 'default'.")
+    identity_token: str | None = Field(None, description="Signed token from POST /identify; resolves the user by identity primary key.")
     sku: str = Field(..., description="Offer SKU to grant (e.g. OFF_PREMIUM_PACK). Automatically normalized to uppercase. Internal currency is consumed automatically.")
     metadata: dict[str, Any] | None = Field(None, description="Optional context (JSON). Stored in the transaction and returned in the response.")
 
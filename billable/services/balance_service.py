@@ -9,14 +9,20 @@ from __future__ import annotations
 import logging
 from typing import Any
 
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Case, IntegerField, Max, Min, Q, Sum, Value, When
 
+from ..cache import abalance_cache_key, balance_cache_key
+from ..conf import billable_settings
 from ..models import Product, QuotaBatch
 from .transaction_service import TransactionService
 
 logger = logging.getLogger(__name__)
 
+# Product types reported as is_unlimited in the balance summary
+_UNLIMITED_TYPES = frozenset({Product.ProductType.UNLIMITED, Product.ProductType.PERIOD})
+
 
 class BalanceService:
     """Service for working with user balances and inventory."""
@@ -55,44 +61,70 @@ class BalanceService:
         Returns active products asynchronously.
         """
         qs = cls.get_user_active_products(user_id, product_key)
-        results = []
-        async for obj in qs.aiterator():
-            results.append(obj)
-        return results
+        return [obj async for obj in qs]
 
     @classmethod
-    def get_balance_summary(cls, user_id: int) -> dict[str, Any]:
+    def _balance_summary_queryset(cls, user_id: int):
         """
-        Returns summary information about a user's balance by product_key (v2 engine).
+        Builds the per-product_key aggregate of a user's active batches.
+
+        The database does the grouping, so one row per product_key is fetched
+        instead of every active batch.
         """
-        batches = QuotaBatch.objects.filter(
-            user_id=user_id,
-            state=QuotaBatch.State.ACTIVE
-        ).select_related('product')
+        return (
+            QuotaBatch.objects.filter(user_id=user_id, state=QuotaBatch.State.ACTIVE)
+            .order_by()
+            .values("product__product_key")
+            .annotate(
+                total=Sum("initial_quantity"),
+                remaining=Sum("remaining_quantity"),
+                expiry=Min("expires_at"),
+                is_unlimited=Max(
+                    Case(
+                        When(
+                            product__product_type__in=_UNLIMITED_TYPES,
+                            then=Value(1),
+                        ),
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                ),
+            )
+            .values_list("product__product_key", "total", "remaining", "expiry", "is_unlimited")
+        )
 
-        summary = {}
-        for qb in batches:
-            key = qb.product.product_key
-            if key not in summary:
-                summary[key] = {
-                    "total": 0,
-                    "used": 0,
-                    "remaining": 0,
-                    "is_unlimited": False,
-                    "expiry": None
-                }
-
-            if qb.product.product_type in [Product.ProductType.UNLIMITED, Product.ProductType.PERIOD]:
-                summary[key]["is_unlimited"] = True
-
-            summary[key]["total"] += qb.initial_quantity
-            summary[key]["remaining"] += qb.remaining_quantity
-            summary[key]["used"] += (qb.initial_quantity - qb.remaining_quantity)
-
-            if qb.expires_at:
-                if not summary[key]["expiry"] or qb.expires_at < summary[key]["expiry"]:
-                    summary[key]["expiry"] = qb.expires_at
+    @staticmethod
+    def _summary_entry(total: int, remaining: int, expiry, is_unlimited: int) -> dict[str, Any]:
+        """Converts the aggregate columns of one product_key into a balance summary entry."""
+        return {
+            "total": total,
+            "used": total - remaining,
+            "remaining": remaining,
+            "is_unlimited": bool(is_unlimited),
+            "expiry": expiry,
+        }
 
+    @classmethod
+    def get_balance_summary(cls, user_id: int) -> dict[str, Any]:
+        """
+        Returns summary information about a user's balance by product_key (v2 engine).
+
+        Cached for BILLABLE_BALANCE_CACHE_TTL seconds; any change to the user's
+        batches invalidates the entry.
+        """
+        cache_ttl = billable_settings.BALANCE_CACHE_TTL
+        if cache_ttl:
+            cache_key = balance_cache_key("summary", user_id)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        summary = {
+            key: cls._summary_entry(total, remaining, expiry, is_unlimited)
+            for key, total, remaining, expiry, is_unlimited in cls._balance_summary_queryset(user_id)
+        }
+        if cache_ttl:
+            cache.set(cache_key, summary, cache_ttl)
         return summary
 
     @classmethod
@@ -100,35 +132,76 @@ class BalanceService:
         """
         Returns summary information about a user's balance by product_key asynchronously.
         """
-        batches = QuotaBatch.objects.filter(
-            user_id=user_id,
-            state=QuotaBatch.State.ACTIVE
-        ).select_related('product')
+        cache_ttl = billable_settings.BALANCE_CACHE_TTL
+        if cache_ttl:
+            cache_key = await abalance_cache_key("summary", user_id)
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        summary = {
+            key: cls._summary_entry(total, remaining, expiry, is_unlimited)
+            async for key, total, remaining, expiry, is_unlimited in cls._balance_summary_queryset(user_id)
+        }
+        if cache_ttl:
+            await cache.aset(cache_key, summary, cache_ttl)
+        return summary
 
-        summary = {}
-        async for qb in batches.aiterator():
-            key = qb.product.product_key
-            if key not in summary:
-                summary[key] = {
-                    "total": 0,
-                    "used": 0,
-                    "remaining": 0,
-                    "is_unlimited": False,
-                    "expiry": None
-                }
-
-            if qb.product.product_type in [Product.ProductType.UNLIMITED, Product.ProductType.PERIOD]:
-                summary[key]["is_unlimited"] = True
-
-            summary[key]["total"] += qb.initial_quantity
-            summary[key]["remaining"] += qb.remaining_quantity
-            summary[key]["used"] += (qb.initial_quantity - qb.remaining_quantity)
-
-            if qb.expires_at:
-                if not summary[key]["expiry"] or qb.expires_at < summary[key]["expiry"]:
-                    summary[key]["expiry"] = qb.expires_at
+    @classmethod
+    def _wallet_balances_queryset(cls, user_id: int):
+        """
+        Builds (product_id, product_key, remaining) rows summed per product of active batches.
+        """
+        return (
+            QuotaBatch.objects.filter(user_id=user_id, state=QuotaBatch.State.ACTIVE)
+            .order_by()
+            .values("product_id", "product__product_key")
+            .annotate(remaining=Sum("remaining_quantity"))
+            .values_list("product_id", "product__product_key", "remaining")
+        )
 
-        return summary
+    @classmethod
+    def get_wallet_balances(cls, user_id: int) -> dict[str, int]:
+        """
+        Returns remaining quantity per product_key across active batches.
+
+        Products without a product_key are reported as "prod_<id>".
+        Cached like get_balance_summary.
+        """
+        cache_ttl = billable_settings.BALANCE_CACHE_TTL
+        if cache_ttl:
+            cache_key = balance_cache_key("wallet", user_id)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        balances = {
+            product_key or f"prod_{product_id}": remaining
+            for product_id, product_key, remaining in cls._wallet_balances_queryset(user_id)
+        }
+        if cache_ttl:
+            cache.set(cache_key, balances, cache_ttl)
+        return balances
+
+    @classmethod
+    async def aget_wallet_balances(cls, user_id: int) -> dict[str, int]:
+        """
+        Returns remaining quantity per product_key across active batches asynchronously.
+        """
+        cache_ttl = billable_settings.BALANCE_CACHE_TTL
+        if cache_ttl:
+            cache_key = await abalance_cache_key("wallet", user_id)
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        balances = {
+            product_key or f"prod_{product_id}": remaining
+            async for product_id, product_key, remaining in cls._wallet_balances_queryset(user_id)
+        }
+        if cache_ttl:
+            await cache.aset(cache_key, balances, cache_ttl)
+        return balances
 
     @classmethod
     def deactivate_expired_products(cls, user_id: int | None = None) -> int:
@@ -7,9 +7,11 @@ from __future__ import annotations
 
 import logging
 from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
 from django.contrib.auth import get_user_model
 from asgiref.sync import sync_to_async
 
+from billable.cache import invalidate_user_balance
 from billable.models import (
     Order, QuotaBatch, Transaction, ExternalIdentity, Referral
 )
@@ -45,12 +47,6 @@ class CustomerService:
         if target_user_id == source_user_id:
             raise ValueError("Target and source users must be different.")
 
-        if not User.objects.filter(pk=target_user_id).exists():
-            raise ValueError(f"Target user {target_user_id} does not exist.")
-        
-        if not User.objects.filter(pk=source_user_id).exists():
-            raise ValueError(f"Source user {source_user_id} does not exist.")
-
         stats = {
             "moved_orders": 0,
             "moved_batches": 0,
@@ -60,56 +56,96 @@ class CustomerService:
         }
 
         with transaction.atomic():
+            # Both users are checked with one query, which also reports which
+            # tables hold source data so empty UPDATEs can be skipped
+            users = {
+                row["pk"]: row
+                for row in User.objects.filter(pk__in=[target_user_id, source_user_id])
+                .annotate(
+                    has_orders=Exists(Order.objects.filter(user_id=OuterRef("pk"))),
+                    has_batches=Exists(QuotaBatch.objects.filter(user_id=OuterRef("pk"))),
+                    has_transactions=Exists(Transaction.objects.filter(user_id=OuterRef("pk"))),
+                    has_referrals=Exists(
+                        Referral.objects.filter(Q(referrer_id=OuterRef("pk")) | Q(referee_id=OuterRef("pk")))
+                    ),
+                )
+                .values("pk", "has_orders", "has_batches", "has_transactions", "has_referrals")
+            }
+            if target_user_id not in users:
+                raise ValueError(f"Target user {target_user_id} does not exist.")
+            if source_user_id not in users:
+                raise ValueError(f"Source user {source_user_id} does not exist.")
+            source = users[source_user_id]
+
             # 1. Handle ExternalIdentities
             # If both have same provider, we might have a conflict.
-            source_identities = ExternalIdentity.objects.filter(user_id=source_user_id)
-            for identity in source_identities:
-                # Check if target already has this provider
-                if ExternalIdentity.objects.filter(user_id=target_user_id, provider=identity.provider).exists():
-                    logger.warning(
-                        f"Conflict: target user {target_user_id} already has identity for provider {identity.provider}. "
-                        f"Skipping identity {identity.id} from source user {source_user_id}."
-                    )
-                    # Optionally we could delete it or re-link if external_id is same, 
-                    # but for now we follow 6.4: if external_id different, it's an error/conflict.
-                    # If external_id is same, we just delete the source one.
-                    target_identity = ExternalIdentity.objects.get(user_id=target_user_id, provider=identity.provider)
-                    if target_identity.external_id == identity.external_id:
-                        identity.delete()
-                    else:
-                        # Different external_id for same provider - this is a real conflict
-                        raise ValueError(
-                            f"Identity conflict: both users have different external_ids for provider {identity.provider}."
-                        )
+            # Both sides are loaded once and resolved in memory.
+            target_external_ids: dict[str, set[str]] = {}
+            for provider, external_id in ExternalIdentity.objects.filter(
+                user_id=target_user_id
+            ).values_list("provider", "external_id"):
+                target_external_ids.setdefault(provider, set()).add(external_id)
+
+            to_move, to_delete = [], []
+            for identity in ExternalIdentity.objects.filter(user_id=source_user_id):
+                target_ids = target_external_ids.get(identity.provider)
+                if target_ids is None:
+                    to_move.append(identity.pk)
+                    continue
+                logger.warning(
+                    f"Conflict: target user {target_user_id} already has identity for provider {identity.provider}. "
+                    f"Skipping identity {identity.id} from source user {source_user_id}."
+                )
+                # Follows 6.4: if external_id is same, we just delete the source one;
+                # a different external_id for the same provider is a real conflict.
+                if identity.external_id in target_ids:
+                    to_delete.append(identity.pk)
                 else:
-                    identity.user_id = target_user_id
-                    identity.save(update_fields=["user_id"])
-                    stats["moved_identities"] += 1
+                    raise ValueError(
+                        f"Identity conflict: both users have different external_ids for provider {identity.provider}."
+                    )
+
+            if to_delete:
+                ExternalIdentity.objects.filter(pk__in=to_delete).delete()
+            if to_move:
+                stats["moved_identities"] = ExternalIdentity.objects.filter(pk__in=to_move).update(
+                    user_id=target_user_id
+                )
 
             # 2. Move Orders
-            stats["moved_orders"] = Order.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
+            if source["has_orders"]:
+                stats["moved_orders"] = Order.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
 
             # 3. Move QuotaBatches
-            stats["moved_batches"] = QuotaBatch.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
+            if source["has_batches"]:
+                stats["moved_batches"] = QuotaBatch.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
+            if stats["moved_batches"]:
+                invalidate_user_balance(source_user_id)
+                invalidate_user_balance(target_user_id)
 
             # 4. Move Transactions
-            stats["moved_transactions"] = Transaction.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
+            if source["has_transactions"]:
+                stats["moved_transactions"] = Transaction.objects.filter(user_id=source_user_id).update(user_id=target_user_id)
 
             # 5. Move Referrals
-            # Case 1: source_user was a referrer
-            stats["moved_referrals"] += Referral.objects.filter(referrer_id=source_user_id).update(referrer_id=target_user_id)
-            # Case 2: source_user was a referee
-            stats["moved_referrals"] += Referral.objects.filter(referee_id=source_user_id).update(referee_id=target_user_id)
-
-            # Cleanup: remove self-referral if it was created by merge
-            Referral.objects.filter(referrer_id=target_user_id, referee_id=target_user_id).delete()
-
-            # 6. Signal
-            customers_merged.send(
+            # One UPDATE re-points whichever side (referrer and/or referee) was source_user
+            if source["has_referrals"]:
+                stats["moved_referrals"] = Referral.objects.filter(
+                    Q(referrer_id=source_user_id) | Q(referee_id=source_user_id)
+                ).update(
+                    referrer_id=Case(When(referrer_id=source_user_id, then=Value(target_user_id)), default=F("referrer_id")),
+                    referee_id=Case(When(referee_id=source_user_id, then=Value(target_user_id)), default=F("referee_id")),
+                )
+
+                # Cleanup: remove self-referral if it was created by merge
+                Referral.objects.filter(referrer_id=target_user_id, referee_id=target_user_id).delete()
+
+            # 6. Signal (after COMMIT, outside the merge's locks)
+            transaction.on_commit(lambda: customers_merged.send(
                 sender=cls,
                 target_user_id=target_user_id,
                 source_user_id=source_user_id
-            )
+            ))
 
             logger.info(
                 f"Merged customer {source_user_id} into {target_user_id}. Stats: {stats}"
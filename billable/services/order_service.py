@@ -11,7 +11,7 @@ from decimal import Decimal
 from typing import Any, Dict, List
 
 from asgiref.sync import sync_to_async
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
 
 from ..models import Order, OrderItem, Offer
@@ -21,30 +21,39 @@ from .transaction_service import TransactionService
 logger = logging.getLogger(__name__)
 
 
-def _prepare_order_items(items: List[dict[str, Any]]) -> tuple[Decimal, List[dict[str, Any]]]:
+def _normalized_skus(items: List[dict[str, Any]]) -> list[str]:
     """
-    Prepare order items.
+    Validates that every item has a SKU and returns them normalized to uppercase.
     """
-    total_amount = Decimal("0")
-    order_items_data = []
-
+    skus = []
     for item in items:
         sku = item.get("sku")
         if not sku:
             raise ValueError("Item must have 'sku'")
-        # Normalize SKU to uppercase for search
-        normalized_sku = sku.upper()
-        quantity = item.get("quantity", 1)
+        skus.append(sku.upper())
+    return skus
 
-        offer = Offer.objects.filter(sku=normalized_sku, is_active=True).first()
-        if not offer:
-            offer = Offer.objects.filter(sku=normalized_sku).first()
+
+def _build_order_items(
+    items: List[dict[str, Any]], skus: list[str], offers_by_sku: dict[str, Offer]
+) -> tuple[Decimal, List[dict[str, Any]]]:
+    """
+    Resolves items against the fetched offers and computes the order total.
+    """
+    total_amount = Decimal("0")
+    order_items_data = []
+
+    for item, normalized_sku in zip(items, skus):
+        offer = offers_by_sku.get(normalized_sku)
         if not offer:
-            raise ValueError(f"Offer not found for sku: {sku!r}")
+            raise ValueError(f"Offer not found for sku: {item['sku']!r}")
 
+        quantity = item.get("quantity", 1)
         price = item.get("price", offer.price)
-        line_total = Decimal(str(price)) * quantity
-        total_amount += line_total
+        if not isinstance(price, Decimal):
+            # Client-supplied prices may be int/float/str; Offer.price already is Decimal
+            price = Decimal(str(price))
+        total_amount += price * quantity
         
         order_items_data.append({
             "offer": offer,
@@ -55,38 +64,57 @@ def _prepare_order_items(items: List[dict[str, Any]]) -> tuple[Decimal, List[dic
     return total_amount, order_items_data
 
 
+def _prepare_order_items(items: List[dict[str, Any]]) -> tuple[Decimal, List[dict[str, Any]]]:
+    """
+    Prepare order items.
+
+    All offers are fetched with one query (SKU is unique).
+    """
+    skus = _normalized_skus(items)
+    offers_by_sku = {offer.sku: offer for offer in Offer.objects.filter(sku__in=set(skus))}
+    return _build_order_items(items, skus, offers_by_sku)
+
+
 async def _aprepare_order_items(items: List[dict[str, Any]]) -> tuple[Decimal, List[dict[str, Any]]]:
     """
     Prepare order items (async version).
     """
-    total_amount = Decimal("0")
-    order_items_data = []
+    skus = _normalized_skus(items)
+    offers_by_sku = {offer.sku: offer async for offer in Offer.objects.filter(sku__in=set(skus))}
+    return _build_order_items(items, skus, offers_by_sku)
 
-    for item in items:
-        sku = item.get("sku")
-        if not sku:
-            raise ValueError("Item must have 'sku'")
-        # Normalize SKU to uppercase for search
-        normalized_sku = sku.upper()
-        quantity = item.get("quantity", 1)
 
-        offer = await Offer.objects.filter(sku=normalized_sku, is_active=True).afirst()
-        if not offer:
-            offer = await Offer.objects.filter(sku=normalized_sku).afirst()
-        if not offer:
-            raise ValueError(f"Offer not found for sku: {sku!r}")
+def _save_order(
+    user_id: int,
+    total_amount: Decimal,
+    order_items_data: List[dict[str, Any]],
+    metadata: dict[str, Any] | None,
+) -> Order:
+    """
+    Inserts a pending order and its items in one transaction.
+    """
+    with transaction.atomic():
+        order = Order.objects.create(
+            user_id=user_id,
+            total_amount=total_amount,
+            status=Order.Status.PENDING,
+            metadata=metadata or {}
+        )
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, **item_data) for item_data in order_items_data]
+        )
+    return order
+
+
+def _lock_order(order_id: int) -> Order:
+    """
+    Fetches an order with a row lock for a status change.
 
-        price = item.get("price", offer.price)
-        line_total = Decimal(str(price)) * quantity
-        total_amount += line_total
-        
-        order_items_data.append({
-            "offer": offer,
-            "quantity": quantity,
-            "price": price,
-        })
-    
-    return total_amount, order_items_data
+    Uses FOR NO KEY UPDATE where supported (PostgreSQL): the key is never
+    changed, so inserts referencing the order (e.g. OrderItem) are not blocked.
+    """
+    no_key = connection.features.has_select_for_no_key_update
+    return Order.objects.select_for_update(no_key=no_key).get(id=order_id)
 
 
 class OrderService:
@@ -101,17 +129,50 @@ class OrderService:
     ) -> Order:
         """Creates a new order synchronously."""
         total_amount, order_items_data = _prepare_order_items(items)
+        return _save_order(user_id, total_amount, order_items_data, metadata)
 
-        with transaction.atomic():
-            order = Order.objects.create(
-                user_id=user_id,
+    @classmethod
+    def create_orders_bulk(cls, carts: List[dict[str, Any]]) -> List[Order]:
+        """
+        Creates several pending orders at once (imports, batch checkouts).
+
+        Each cart is a dict with "user_id", "items" (same format as create_order)
+        and optional "metadata". Offers for all carts are resolved with one query,
+        and orders and their items are inserted with one bulk_create each.
+
+        Raises:
+            ValueError: If an item has no sku or its offer is not found; nothing is created.
+        """
+        skus_per_cart = [_normalized_skus(cart["items"]) for cart in carts]
+        all_skus = {sku for skus in skus_per_cart for sku in skus}
+        offers_by_sku = {offer.sku: offer for offer in Offer.objects.filter(sku__in=all_skus)}
+        prepared = [
+            _build_order_items(cart["items"], skus, offers_by_sku)
+            for cart, skus in zip(carts, skus_per_cart)
+        ]
+
+        orders = [
+            Order(
+                user_id=cart["user_id"],
                 total_amount=total_amount,
                 status=Order.Status.PENDING,
-                metadata=metadata or {}
+                metadata=cart.get("metadata") or {},
             )
-            for item_data in order_items_data:
-                OrderItem.objects.create(order=order, **item_data)
-        return order
+            for cart, (total_amount, _) in zip(carts, prepared)
+        ]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Order.objects.bulk_create(orders)
+            else:
+                # Items need the order PKs, which this backend does not return from bulk inserts
+                for order in orders:
+                    order.save(force_insert=True)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, **item_data)
+                for order, (_, order_items_data) in zip(orders, prepared)
+                for item_data in order_items_data
+            ])
+        return orders
 
     @classmethod
     async def acreate_order(
@@ -124,19 +185,10 @@ class OrderService:
         # Prepare data async
         total_amount, order_items_data = await _aprepare_order_items(items)
 
-        def _do_save_sync():
-            with transaction.atomic():
-                order = Order.objects.create(
-                    user_id=user_id,
-                    total_amount=total_amount,
-                    status=Order.Status.PENDING,
-                    metadata=metadata or {}
-                )
-                for item_data in order_items_data:
-                    OrderItem.objects.create(order=order, **item_data)
-                return order
-
-        return await sync_to_async(_do_save_sync, thread_sensitive=True)()
+        # Django has no async transactions, so only the atomic write hops to a thread
+        return await sync_to_async(_save_order, thread_sensitive=True)(
+            user_id, total_amount, order_items_data, metadata
+        )
 
     @classmethod
     def process_payment(
@@ -147,20 +199,23 @@ class OrderService:
     ) -> bool:
         """Confirms order payment and activates products."""
         with transaction.atomic():
-            order = Order.objects.select_for_update().get(id=order_id)
+            order = _lock_order(order_id)
             if order.status == Order.Status.PAID: return True
 
             order.status = Order.Status.PAID
             order.payment_id = payment_id
             order.payment_method = payment_method
             order.paid_at = timezone.now()
-            order.save()
+            order.save(update_fields=["status", "payment_id", "payment_method", "paid_at"])
 
-            for item in order.items.all():
-                if item.offer:
-                    TransactionService.grant_offer(user_id=order.user_id, offer=item.offer, order_item=item, source="purchase")
-            
-            order_confirmed.send(sender=cls, order=order)
+            # All paid items are granted together: one query for offer items,
+            # one INSERT per table
+            grants = [(item.offer, item) for item in order.items.select_related("offer") if item.offer]
+            if grants:
+                TransactionService.grant_offers_bulk(user_id=order.user_id, grants=grants, source="purchase")
+
+            # Receivers run after COMMIT, so they never extend the order row lock
+            transaction.on_commit(lambda: order_confirmed.send(sender=cls, order=order))
             return True
 
     @classmethod
@@ -171,13 +226,15 @@ class OrderService:
     @classmethod
     def cancel_order(cls, order_id: int, reason: str | None = None) -> bool:
         with transaction.atomic():
-            order = Order.objects.select_for_update().get(id=order_id)
+            order = _lock_order(order_id)
             if order.status in [Order.Status.PAID, Order.Status.REFUNDED]: return False
             order.status = Order.Status.CANCELLED
+            update_fields = ["status"]
             if reason:
                 if not order.metadata: order.metadata = {}
                 order.metadata["cancel_reason"] = reason
-            order.save()
+                update_fields.append("metadata")
+            order.save(update_fields=update_fields)
             return True
 
     @classmethod
@@ -192,7 +249,7 @@ class OrderService:
         Changes status to REFUNDED and revokes associated quotas.
         """
         with transaction.atomic():
-            order = Order.objects.select_for_update().get(id=order_id)
+            order = _lock_order(order_id)
             if order.status != Order.Status.PAID:
                 logger.warning(f"refund_order: Order #{order_id} is not PAID (status: {order.status})")
                 return False
@@ -202,10 +259,12 @@ class OrderService:
             
             # 2. Update order status
             order.status = Order.Status.REFUNDED
+            update_fields = ["status"]
             if reason:
                 if not order.metadata: order.metadata = {}
                 order.metadata["refund_reason"] = reason
-            order.save()
+                update_fields.append("metadata")
+            order.save(update_fields=update_fields)
             
             logger.info(f"refund_order: Order #{order_id} refunded successfully")
             return True
@@ -217,15 +276,25 @@ class OrderService:
 
     @classmethod
     async def aserialize_order_to_dict(cls, order: Order) -> Dict[str, Any]:
-        """Native async serialization using aiterator."""
-        items_list = []
-        async for item in order.items.select_related("offer").aiterator():
-            items_list.append({
+        """
+        Native async serialization.
+
+        Uses prefetched items (e.g. from Order.objects.with_items()) when present,
+        otherwise loads items with their offers in one query.
+        """
+        if "items" in getattr(order, "_prefetched_objects_cache", {}):
+            items = order.items.all()
+        else:
+            items = [item async for item in order.items.select_related("offer")]
+        items_list = [
+            {
                 "id": item.id,
                 "sku": item.offer.sku if item.offer else "unknown",
                 "quantity": item.quantity,
                 "price": item.price,
-            })
+            }
+            for item in items
+        ]
         
         return {
             "id": order.id, "user_id": order.user_id, "status": order.status,
@@ -9,6 +9,10 @@ import logging
 from decimal import Decimal
 from typing import List
 
+from django.core.cache import cache
+
+from ..cache import acatalog_cache_key, catalog_cache_key
+from ..conf import billable_settings
 from ..models import Product, Offer
 
 logger = logging.getLogger(__name__)
@@ -22,38 +26,76 @@ class ProductService:
         """
         Returns a list of active products.
 
+        Cached for BILLABLE_CATALOG_CACHE_TTL seconds; any catalog change invalidates it.
+
         Returns:
             List of active products.
         """
-        return list(Product.objects.filter(is_active=True))
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if cache_ttl:
+            cache_key = catalog_cache_key("products")
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        products = list(Product.objects.filter(is_active=True))
+        if cache_ttl:
+            cache.set(cache_key, products, cache_ttl)
+        return products
 
     @classmethod
     def get_product_by_key(cls, product_key: str) -> Product | None:
         """
         Finds a product by its product_key.
         
-        Normalizes product_key to uppercase before searching.
+        Normalizes product_key to uppercase before searching. With the catalog
+        cache enabled, lookups are served from a cached product_key index of
+        active products.
         """
         normalized_key = product_key.upper() if product_key else None
-        return Product.objects.filter(product_key=normalized_key, is_active=True).first()
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if not cache_ttl:
+            return Product.objects.filter(product_key=normalized_key, is_active=True).first()
+
+        cache_key = catalog_cache_key("products_by_key")
+        index = cache.get(cache_key)
+        if index is None:
+            index = {p.product_key: p for p in cls.get_active_products() if p.product_key}
+            cache.set(cache_key, index, cache_ttl)
+        return index.get(normalized_key)
 
     @classmethod
     def get_trial_products(cls) -> List[Product]:
-        """Returns products marked as trial."""
-        return list(Product.objects.filter(
-            is_active=True,
-            name__icontains="trial"
-        ))
+        """
+        Returns products marked as trial (active, "trial" in the name).
+
+        Filtered in Python from the (cached) active product list instead of a
+        LIKE query.
+        """
+        return [p for p in cls.get_active_products() if "trial" in p.name.lower()]
+
+    @classmethod
+    async def aget_trial_products(cls) -> List[Product]:
+        """
+        Async version: Returns products marked as trial.
+        """
+        return [p for p in await cls.aget_active_products() if "trial" in p.name.lower()]
 
     @classmethod
     async def aget_active_products(cls) -> List[Product]:
         """
         Async version: Returns a list of active products.
         """
-        products = []
-        qs = Product.objects.filter(is_active=True)
-        async for product in qs.aiterator():
-            products.append(product)
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if cache_ttl:
+            cache_key = await acatalog_cache_key("products")
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        products = [product async for product in Product.objects.filter(is_active=True)]
+        if cache_ttl:
+            await cache.aset(cache_key, products, cache_ttl)
         return products
 
     @classmethod
@@ -64,4 +106,13 @@ class ProductService:
         Normalizes product_key to uppercase before searching.
         """
         normalized_key = product_key.upper() if product_key else None
-        return await Product.objects.filter(product_key=normalized_key, is_active=True).afirst()
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if not cache_ttl:
+            return await Product.objects.filter(product_key=normalized_key, is_active=True).afirst()
+
+        cache_key = await acatalog_cache_key("products_by_key")
+        index = await cache.aget(cache_key)
+        if index is None:
+            index = {p.product_key: p for p in await cls.aget_active_products() if p.product_key}
+            await cache.aset(cache_key, index, cache_ttl)
+        return index.get(normalized_key)
@@ -18,15 +18,29 @@ from uuid import UUID
 from dateutil.relativedelta import relativedelta
 
 from asgiref.sync import sync_to_async
-from django.db import transaction
-from django.db.models import Sum, Q
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Min, Q, Sum
 from django.utils import timezone
 
+from ..cache import acatalog_cache_key, catalog_cache_key, invalidate_all_balances, invalidate_user_balance
+from ..conf import billable_settings
 from ..models import Product, Offer, OfferItem, QuotaBatch, Transaction, OrderItem, TrialHistory
 from ..signals import quota_consumed, trial_activated, transaction_created
 
 logger = logging.getLogger(__name__)
 
+# Sentinel distinguishing a cache miss from a cached "product not found"
+_MISSING = object()
+
+# OfferItem.period_unit -> batch lifetime for period_value units (FOREVER never expires)
+_PERIOD_DELTA = {
+    OfferItem.PeriodUnit.HOURS: lambda value: timedelta(hours=value),
+    OfferItem.PeriodUnit.DAYS: lambda value: timedelta(days=value),
+    OfferItem.PeriodUnit.MONTHS: lambda value: relativedelta(months=value),
+    OfferItem.PeriodUnit.YEARS: lambda value: relativedelta(years=value),
+}
+
 
 class TransactionService:
     """
@@ -35,12 +49,14 @@ class TransactionService:
     """
 
     @classmethod
-    def _find_active_batches(cls, user_id: int, product_key: str | None = None):
+    def _find_active_batches(cls, user_id: int, product_key: str | None = None, product_id: int | None = None):
         """
         Finds active batches for a user, filtered by product_key.
         Returns QuerySet[QuotaBatch].
         
-        Normalizes product_key to uppercase before filtering.
+        Normalizes product_key to uppercase before filtering. A product_id resolved
+        by _product_id_for_key filters QuotaBatch.product_id directly and does not
+        load the product, so the query has no join to products.
         """
         now = timezone.now()
         qs = QuotaBatch.objects.filter(
@@ -48,45 +64,90 @@ class TransactionService:
             state=QuotaBatch.State.ACTIVE
         ).filter(
             Q(expires_at__isnull=True) | Q(expires_at__gt=now)
-        ).select_related('product')
+        )
 
+        if product_id is not None:
+            return qs.filter(product_id=product_id)
+        qs = qs.select_related('product')
         if product_key:
             # Normalize product_key to uppercase
             normalized_key = product_key.upper()
             qs = qs.filter(product__product_key=normalized_key)
         return qs
 
+    @staticmethod
+    def _product_id_for_key(product_key: str | None) -> int | None:
+        """
+        Resolves product_key to a product id from the catalog cache.
+
+        Returns None when the catalog cache is disabled or the product is unknown;
+        callers then fall back to filtering by product_key.
+        """
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if not cache_ttl or not product_key:
+            return None
+        normalized_key = product_key.upper()
+        cache_key = catalog_cache_key("product_id", normalized_key)
+        product_id = cache.get(cache_key)
+        if product_id is None:
+            product_id = Product.objects.filter(product_key=normalized_key).values_list("id", flat=True).first()
+            if product_id is not None:
+                cache.set(cache_key, product_id, cache_ttl)
+        return product_id
+
+    @staticmethod
+    async def _aproduct_id_for_key(product_key: str | None) -> int | None:
+        """Async version of _product_id_for_key."""
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if not cache_ttl or not product_key:
+            return None
+        normalized_key = product_key.upper()
+        cache_key = await acatalog_cache_key("product_id", normalized_key)
+        product_id = await cache.aget(cache_key)
+        if product_id is None:
+            product_id = await Product.objects.filter(product_key=normalized_key).values_list("id", flat=True).afirst()
+            if product_id is not None:
+                await cache.aset(cache_key, product_id, cache_ttl)
+        return product_id
+
     @classmethod
     def get_balance(cls, user_id: int, product_key: str) -> int:
         """
         3.2 Access Check (Simple)
         Returns total active remaining quantity for a specific product key.
         """
-        batches = cls._find_active_batches(user_id, product_key=product_key)
+        batches = cls._find_active_batches(
+            user_id, product_key=product_key, product_id=cls._product_id_for_key(product_key)
+        )
         total = batches.aggregate(total=Sum('remaining_quantity'))['total']
         return total or 0
 
     @classmethod
     async def aget_balance(cls, user_id: int, product_key: str) -> int:
         """Async version of get_balance using aaggregate."""
-        batches = cls._find_active_batches(user_id, product_key=product_key)
+        batches = cls._find_active_batches(
+            user_id, product_key=product_key, product_id=await cls._aproduct_id_for_key(product_key)
+        )
         res = await batches.aaggregate(total=Sum('remaining_quantity'))
         return res['total'] or 0
 
     @classmethod
-    def check_quota(cls, user_id: int, product_key: str) -> dict[str, Any]:
+    def _quota_check_queryset(cls, user_id: int, product_key: str, product_id: int | None = None):
         """
-        3.2 Access Check (Detailed)
-        Checks availability for a product_key.
+        Active batches for a quota check; callers aggregate the total and the
+        product name in one query. With a product_key filter all batches share
+        one product, so Min('product__name') just picks its name.
         """
-        batches = cls._find_active_batches(user_id, product_key=product_key)
-        total = batches.aggregate(total=Sum('remaining_quantity'))['total'] or 0
+        return cls._find_active_batches(user_id, product_key=product_key, product_id=product_id).order_by()
 
+    @staticmethod
+    def _quota_check_result(product_key: str, total: int | None, product_name: str | None) -> dict[str, Any]:
+        """Builds the check_quota response from the aggregated total and product name."""
+        total = total or 0
+        # Return normalized product_key
+        normalized_key = product_key.upper() if product_key else ""
         if total > 0:
-            first_batch = batches.first()
-            product_name = first_batch.product.name if first_batch else "Product"
-            # Return normalized product_key
-            normalized_key = product_key.upper() if product_key else ""
+            product_name = product_name or "Product"
             return {
                 "can_use": True,
                 "product_key": normalized_key,
@@ -94,8 +155,6 @@ class TransactionService:
                 "remaining": total,
                 "message": f"Available: {product_name} ({total} left)"
             }
-        # Return normalized product_key
-        normalized_key = product_key.upper() if product_key else ""
         return {
             "can_use": False,
             "product_key": normalized_key,
@@ -103,34 +162,28 @@ class TransactionService:
             "remaining": 0
         }
 
+    @classmethod
+    def check_quota(cls, user_id: int, product_key: str) -> dict[str, Any]:
+        """
+        3.2 Access Check (Detailed)
+        Checks availability for a product_key.
+        """
+        res = cls._quota_check_queryset(
+            user_id, product_key, cls._product_id_for_key(product_key)
+        ).aggregate(
+            total=Sum('remaining_quantity'), product_name=Min('product__name')
+        )
+        return cls._quota_check_result(product_key, res['total'], res['product_name'])
+
     @classmethod
     async def acheck_quota(cls, user_id: int, product_key: str) -> dict[str, Any]:
         """Native async version of check_quota."""
-        batches = cls._find_active_batches(user_id, product_key=product_key)
-        total = 0
-        product_name = "Product"
-        found = False
-        async for batch in batches.aiterator():
-            if not found:
-                product_name = batch.product.name
-                found = True
-            total += batch.remaining_quantity
-        # Return normalized product_key
-        normalized_key = product_key.upper() if product_key else ""
-        if total > 0:
-            return {
-                "can_use": True,
-                "product_key": normalized_key,
-                "product_name": product_name,
-                "remaining": total,
-                "message": f"Available: {product_name} ({total} left)"
-            }
-        return {
-            "can_use": False,
-            "product_key": normalized_key,
-            "message": f"No active quota for {normalized_key}",
-            "remaining": 0
-        }
+        res = await cls._quota_check_queryset(
+            user_id, product_key, await cls._aproduct_id_for_key(product_key)
+        ).aaggregate(
+            total=Sum('remaining_quantity'), product_name=Min('product__name')
+        )
+        return cls._quota_check_result(product_key, res['total'], res['product_name'])
 
     @classmethod
     @transaction.atomic
@@ -142,31 +195,45 @@ class TransactionService:
         source: str = "purchase",
         metadata: dict[str, Any] | None = None
     ) -> list[QuotaBatch]:
-        """3.1 Granting / Purchase"""
-        items = offer.items.all()
-        created_batches = []
-        now = timezone.now()
+        """
+        3.1 Granting / Purchase
 
-        for item in items:
-            expires_at = None
-            if item.period_unit != OfferItem.PeriodUnit.FOREVER and item.period_value:
-                if item.period_unit == OfferItem.PeriodUnit.HOURS:
-                    delta = timedelta(hours=item.period_value)
-                elif item.period_unit == OfferItem.PeriodUnit.DAYS:
-                    delta = timedelta(days=item.period_value)
-                elif item.period_unit == OfferItem.PeriodUnit.MONTHS:
-                    delta = relativedelta(months=item.period_value)
-                elif item.period_unit == OfferItem.PeriodUnit.YEARS:
-                    delta = relativedelta(years=item.period_value)
-                else:
-                    delta = timedelta(days=0)
-                expires_at = now + delta
+        Batches and their CREDIT transactions are inserted with one bulk_create each.
+        """
+        items = offer.items.select_related('product')
+        batches, txs = cls._build_grant_rows(
+            user_id, offer, items, order_item, source, metadata, timezone.now()
+        )
+        cls._insert_grant_rows(user_id, batches, txs)
+        return batches
+
+    @staticmethod
+    def _item_expires_at(item: OfferItem, now):
+        """Computes the expiry of a batch granted from an offer item (None for FOREVER)."""
+        if item.period_unit == OfferItem.PeriodUnit.FOREVER or not item.period_value:
+            return None
+        make_delta = _PERIOD_DELTA.get(item.period_unit)
+        return now + make_delta(item.period_value) if make_delta else now
 
+    @classmethod
+    def _build_grant_rows(
+        cls,
+        user_id: int,
+        offer: Offer,
+        items,
+        order_item: OrderItem | None,
+        source: str,
+        metadata: dict[str, Any] | None,
+        now,
+    ) -> tuple[list[QuotaBatch], list[Transaction]]:
+        """Builds (unsaved) batches and their CREDIT transactions for one offer grant."""
+        batches, txs = [], []
+        for item in items:
             total_quantity = item.quantity
             if order_item:
                 total_quantity *= order_item.quantity
 
-            batch = QuotaBatch.objects.create(
+            batch = QuotaBatch(
                 user_id=user_id,
                 product=item.product,
                 source_offer=offer,
@@ -174,12 +241,11 @@ class TransactionService:
                 initial_quantity=total_quantity,
                 remaining_quantity=total_quantity,
                 valid_from=now,
-                expires_at=expires_at,
+                expires_at=cls._item_expires_at(item, now),
                 state=QuotaBatch.State.ACTIVE
             )
-            created_batches.append(batch)
-
-            tx = Transaction.objects.create(
+            batches.append(batch)
+            txs.append(Transaction(
                 user_id=user_id,
                 quota_batch=batch,
                 amount=total_quantity,
@@ -187,10 +253,62 @@ class TransactionService:
                 action_type=source,
                 related_object=order_item if order_item else offer,
                 metadata=metadata or {}
-            )
+            ))
+        return batches, txs
+
+    @classmethod
+    def _insert_grant_rows(cls, user_id: int, batches: list[QuotaBatch], txs: list[Transaction]) -> None:
+        """Inserts grant rows with one INSERT per table and sends transaction_created for each."""
+        # UUID primary keys are assigned in Python, so transactions can reference
+        # the batches on every backend
+        QuotaBatch.objects.bulk_create(batches)
+        Transaction.objects.bulk_create(txs)
+        # bulk_create sends no post_save, so the owner's cached balance is dropped here
+        invalidate_user_balance(user_id)
+        for tx in txs:
             transaction_created.send(sender=cls, transaction=tx)
 
-        return created_batches
+    @classmethod
+    @transaction.atomic
+    def grant_offers_bulk(
+        cls,
+        user_id: int,
+        grants: list[tuple[Offer, OrderItem | None]],
+        source: str = "purchase",
+        metadata: dict[str, Any] | None = None
+    ) -> list[QuotaBatch]:
+        """
+        Grants several offers to one user at once (e.g. all items of a paid order).
+
+        Offer items of all offers are loaded with one query, and batches and
+        transactions are inserted with one bulk_create each.
+
+        Args:
+            user_id: User receiving the grants.
+            grants: (offer, order_item) pairs; order_item may be None.
+            source: action_type recorded on the CREDIT transactions.
+            metadata: Optional metadata stored on every transaction.
+
+        Returns:
+            list[QuotaBatch]: Created batches, in grant order.
+        """
+        items_by_offer: dict[int, list[OfferItem]] = {}
+        for item in OfferItem.objects.filter(
+            offer_id__in={offer.pk for offer, _ in grants}
+        ).select_related('product').order_by('pk'):
+            items_by_offer.setdefault(item.offer_id, []).append(item)
+
+        now = timezone.now()
+        batches, txs = [], []
+        for offer, order_item in grants:
+            offer_batches, offer_txs = cls._build_grant_rows(
+                user_id, offer, items_by_offer.get(offer.pk, []), order_item, source, metadata, now
+            )
+            batches.extend(offer_batches)
+            txs.extend(offer_txs)
+
+        cls._insert_grant_rows(user_id, batches, txs)
+        return batches
 
     @classmethod
     async def agrant_offer(
@@ -204,10 +322,8 @@ class TransactionService:
         """3.1 Granting / Purchase (Async version)"""
         now = timezone.now()
         
-        # Collect items asynchronously
-        items = []
-        async for item in offer.items.select_related('product').aiterator():
-            items.append(item)
+        # Iterating the queryset fetches all items in one thread hop
+        items = [item async for item in offer.items.select_related('product')]
 
         # Pre-fetch related data if needed to avoid sync DB calls inside sync_to_async if they are not cached
         # But here we pass 'items' which are already fetched.
@@ -217,50 +333,11 @@ class TransactionService:
         def _do_grant_sync():
             # Ensure we are in a sync context where Django allows DB operations
             with transaction.atomic():
-                created_batches = []
-                for item in items:
-                    expires_at = None
-                    if item.period_unit != OfferItem.PeriodUnit.FOREVER and item.period_value:
-                        if item.period_unit == OfferItem.PeriodUnit.HOURS:
-                            delta = timedelta(hours=item.period_value)
-                        elif item.period_unit == OfferItem.PeriodUnit.DAYS:
-                            delta = timedelta(days=item.period_value)
-                        elif item.period_unit == OfferItem.PeriodUnit.MONTHS:
-                            delta = relativedelta(months=item.period_value)
-                        elif item.period_unit == OfferItem.PeriodUnit.YEARS:
-                            delta = relativedelta(years=item.period_value)
-                        else:
-                            delta = timedelta(days=0)
-                        expires_at = now + delta
-
-                    total_quantity = item.quantity
-                    if order_item:
-                        total_quantity *= order_item.quantity
-
-                    batch = QuotaBatch.objects.create(
-                        user_id=user_id,
-                        product=item.product,
-                        source_offer=offer,
-                        order_item=order_item,
-                        initial_quantity=total_quantity,
-                        remaining_quantity=total_quantity,
-                        valid_from=now,
-                        expires_at=expires_at,
-                        state=QuotaBatch.State.ACTIVE
-                    )
-                    created_batches.append(batch)
-
-                    tx = Transaction.objects.create(
-                        user_id=user_id,
-                        quota_batch=batch,
-                        amount=total_quantity,
-                        direction=Transaction.Direction.CREDIT,
-                        action_type=source,
-                        related_object=order_item if order_item else offer,
-                        metadata=metadata or {}
-                    )
-                    transaction_created.send(sender=cls, transaction=tx)
-                return created_batches
+                batches, txs = cls._build_grant_rows(
+                    user_id, offer, items, order_item, source, metadata, now
+                )
+                cls._insert_grant_rows(user_id, batches, txs)
+                return batches
 
         return await sync_to_async(_do_grant_sync, thread_sensitive=True)()
 
@@ -275,34 +352,79 @@ class TransactionService:
         idempotency_key: str | None = None,
         metadata: dict[str, Any] | None = None
     ) -> dict[str, Any]:
-        """3.3 Consumption (FIFO)"""
+        """
+        3.3 Consumption (FIFO)
+
+        The idempotency_key is stored on the last DEBIT transaction; a unique
+        constraint on (user, action_type, idempotency_key) turns a concurrent
+        duplicate into the previously created usage instead of a second debit.
+        """
+        if idempotency_key:
+            existing = cls._idempotent_usage(user_id, action_type, idempotency_key)
+            if existing:
+                return existing
+        try:
+            return cls._consume_quota(
+                user_id, product_key, action_type, amount, action_id, idempotency_key, metadata
+            )
+        except IntegrityError:
+            existing = cls._idempotent_usage(user_id, action_type, idempotency_key) if idempotency_key else None
+            if existing is None:
+                raise
+            return existing
+
+    @classmethod
+    def _idempotent_usage(cls, user_id: int, action_type: str, idempotency_key: str) -> dict[str, Any] | None:
+        """Returns the consume_quota result of an earlier usage with this key, if any."""
+        existing = Transaction.objects.filter(
+            user_id=user_id,
+            action_type=action_type,
+            idempotency_key=idempotency_key
+        ).select_related('quota_batch__product').first()
+        if existing is None:
+            return None
+        return {
+            "success": True,
+            "message": "Quota was consumed previously (idempotent)",
+            "usage_id": str(existing.id),
+            "remaining": cls.get_balance(user_id, existing.quota_batch.product.product_key),
+            "metadata": existing.metadata or {},
+        }
+
+    @classmethod
+    def _consume_quota(
+        cls,
+        user_id: int,
+        product_key: str,
+        action_type: str,
+        amount: int,
+        action_id: str | None,
+        idempotency_key: str | None,
+        metadata: dict[str, Any] | None,
+    ) -> dict[str, Any]:
+        """Locks the user's active batches and debits them oldest first."""
         with transaction.atomic():
-            if idempotency_key:
-                existing = Transaction.objects.filter(
-                    user_id=user_id,
-                    action_type=action_type,
-                    metadata__idempotency_key=idempotency_key
-                ).first()
-                if existing:
-                    return {
-                        "success": True,
-                        "message": "Quota was consumed previously (idempotent)",
-                        "usage_id": str(existing.id),
-                        "remaining": cls.get_balance(user_id, existing.quota_batch.product.product_key),
-                        "metadata": existing.metadata or {},
-                    }
-
-            batches_qs = cls._find_active_batches(user_id, product_key=product_key).order_by('created_at').select_for_update()
+
+            # Lock only batch rows, not the product joined on the product_key path
+            lock_of = ("self",) if connection.features.has_select_for_update_of else ()
+            product_id = cls._product_id_for_key(product_key)
+            batches_qs = cls._find_active_batches(
+                user_id, product_key=product_key, product_id=product_id
+            ).order_by('created_at').select_for_update(of=lock_of)
             remaining_needed = amount
             consumed_info = []
-            active_batches = list(batches_qs)
 
+            # Fast path: when the oldest batch covers the whole amount (the common
+            # amount=1 case), only that row is locked and loaded.
+            active_batches = list(batches_qs[:1])
             if not active_batches:
                 return {"success": False, "error": "quota_exhausted", "message": f"No active quota for {product_key}"}
-                
-            total_available = sum(b.remaining_quantity for b in active_batches)
-            if total_available < amount:
-                 return {"success": False, "error": "insufficient_funds", "message": "Insufficient balance"}
+
+            if active_batches[0].remaining_quantity < amount:
+                active_batches = list(batches_qs)
+                total_available = sum(b.remaining_quantity for b in active_batches)
+                if total_available < amount:
+                     return {"success": False, "error": "insufficient_funds", "message": "Insufficient balance"}
 
             for batch in active_batches:
                 if remaining_needed <= 0: break
@@ -315,17 +437,25 @@ class TransactionService:
                 tx = Transaction.objects.create(
                     user_id=user_id, quota_batch=batch, amount=consume,
                     direction=Transaction.Direction.DEBIT, action_type=action_type,
-                    object_id=action_id, metadata={**(metadata or {}), "idempotency_key": idempotency_key}
+                    object_id=action_id, metadata={**(metadata or {}), "idempotency_key": idempotency_key},
+                    # Only the last transaction carries the key (it is the returned usage_id)
+                    idempotency_key=idempotency_key if remaining_needed == 0 else None,
                 )
                 consumed_info.append(tx)
                 transaction_created.send(sender=cls, transaction=tx)
                 quota_consumed.send(sender=cls, usage=tx)
 
+            # Re-aggregated after the update: the pre-lock snapshot can miss
+            # concurrent consumes that committed while this one waited on the lock
+            remaining = cls._find_active_batches(
+                user_id, product_key=product_key, product_id=product_id
+            ).order_by().aggregate(total=Sum('remaining_quantity'))['total'] or 0
+
             return {
                 "success": True,
                 "message": "Quota consumed",
                 "usage_id": str(consumed_info[-1].id),
-                "remaining": cls.get_balance(user_id, active_batches[0].product.product_key),
+                "remaining": remaining,
                 "metadata": consumed_info[-1].metadata or {},
             }
         
@@ -334,6 +464,29 @@ class TransactionService:
         """Async variant using sync block for transaction."""
         return await sync_to_async(cls.consume_quota, thread_sensitive=True)(*args, **kwargs)
 
+    @staticmethod
+    def _get_currency_product(product_key: str) -> tuple[str, bool] | None:
+        """
+        Returns (product_key, is_currency) for the exchange currency, or None if missing.
+
+        Cached for BILLABLE_CATALOG_CACHE_TTL seconds; any catalog change invalidates it.
+        """
+        cache_ttl = billable_settings.CATALOG_CACHE_TTL
+        if cache_ttl:
+            cache_key = catalog_cache_key("currency_product", product_key)
+            cached = cache.get(cache_key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
+        currency = (
+            Product.objects.filter(product_key=product_key)
+            .values_list("product_key", "is_currency")
+            .first()
+        )
+        if cache_ttl:
+            cache.set(cache_key, currency, cache_ttl)
+        return currency
+
     @classmethod
     @transaction.atomic
     def exchange(
@@ -351,14 +504,14 @@ class TransactionService:
         currency_sku = offer.currency.strip().upper()
         
         # 2. Validate that the product is marked as a currency
-        try:
-            source_product = Product.objects.get(product_key=currency_sku)
-            if not source_product.is_currency:
-                raise ValueError(f"Product '{currency_sku}' is not marked as a currency for exchange.")
-            # Use the actual product key from the DB for consumption
-            currency_sku = source_product.product_key
-        except Product.DoesNotExist:
+        currency = cls._get_currency_product(currency_sku)
+        if currency is None:
             raise ValueError(f"Currency product '{currency_sku}' not found.")
+        product_key, is_currency = currency
+        if not is_currency:
+            raise ValueError(f"Product '{currency_sku}' is not marked as a currency for exchange.")
+        # Use the actual product key from the DB for consumption
+        currency_sku = product_key
 
         price = int(offer.price)
         tx_metadata = {**(metadata or {}), "price": price}
@@ -397,7 +550,11 @@ class TransactionService:
             int: Number of batches updated.
         """
         now = timezone.now()
-        return QuotaBatch.objects.filter(state=QuotaBatch.State.ACTIVE, expires_at__lt=now).update(state=QuotaBatch.State.EXPIRED)
+        updated = QuotaBatch.objects.filter(state=QuotaBatch.State.ACTIVE, expires_at__lt=now).update(state=QuotaBatch.State.EXPIRED)
+        if updated:
+            # update() bypasses post_save, so cached balances are dropped explicitly
+            invalidate_all_balances()
+        return updated
 
     @classmethod
     @transaction.atomic
@@ -413,34 +570,42 @@ class TransactionService:
         Returns:
             int: Number of batches revoked.
         """
-        batches = QuotaBatch.objects.filter(
-            order_item__order=order,
-            state=QuotaBatch.State.ACTIVE
-        ).select_for_update()
+        batches = list(
+            QuotaBatch.objects.filter(
+                order_item__order=order,
+                state=QuotaBatch.State.ACTIVE
+            ).select_for_update().only("id", "user_id", "remaining_quantity")
+        )
+        if not batches:
+            return 0
 
-        revoked_count = 0
-        for batch in batches:
-            amount_to_revoke = batch.remaining_quantity
-            if amount_to_revoke > 0:
-                # Create DEBIT transaction for the remaining amount
-                tx = Transaction.objects.create(
-                    user_id=batch.user_id,
-                    quota_batch=batch,
-                    amount=amount_to_revoke,
-                    direction=Transaction.Direction.DEBIT,
-                    action_type=reason,
-                    related_object=order,
-                    metadata={"reason": "order_refunded"}
-                )
-                transaction_created.send(sender=cls, transaction=tx)
-            
-            # Mark batch as REVOKED and zero out remaining quantity
-            batch.remaining_quantity = 0
-            batch.state = QuotaBatch.State.REVOKED
-            batch.save(update_fields=["remaining_quantity", "state"])
-            revoked_count += 1
-            
-        return revoked_count
+        # DEBIT transactions for the remaining amounts, inserted in one query
+        txs = [
+            Transaction(
+                user_id=batch.user_id,
+                quota_batch=batch,
+                amount=batch.remaining_quantity,
+                direction=Transaction.Direction.DEBIT,
+                action_type=reason,
+                related_object=order,
+                metadata={"reason": "order_refunded"}
+            )
+            for batch in batches
+            if batch.remaining_quantity > 0
+        ]
+        Transaction.objects.bulk_create(txs)
+
+        # Mark batches as REVOKED and zero out remaining quantity; update() skips
+        # post_save, so the balance cache is invalidated explicitly.
+        QuotaBatch.objects.filter(pk__in=[batch.pk for batch in batches]).update(
+            remaining_quantity=0, state=QuotaBatch.State.REVOKED
+        )
+        for user_id in {batch.user_id for batch in batches}:
+            invalidate_user_balance(user_id)
+
+        for tx in txs:
+            transaction_created.send(sender=cls, transaction=tx)
+        return len(batches)
 
     @classmethod
     async def arevoke_order_items(cls, order: Order, reason: str = "refund") -> int:
@@ -8,7 +8,7 @@ from __future__ import annotations
 
 from django.dispatch import Signal
 
-# Sent after successful order payment confirmation
+# Sent after successful order payment confirmation, once the payment transaction commits
 # Arguments: order (Order)
 order_confirmed = Signal()
 
@@ -28,6 +28,6 @@ transaction_created = Signal()
 # Arguments: referral (Referral)
 referral_attached = Signal()
 
-# Sent after successful customer merge
+# Sent after successful customer merge, once the merge transaction commits
 # Arguments: target_user_id (int), source_user_id (int)
 customers_merged = Signal()
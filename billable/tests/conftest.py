@@ -1,9 +1,21 @@
 """Pytest hooks and fixtures for billable tests.
 
 Ensures DJANGO_SETTINGS_MODULE is set when running tests from the repo root
-without pyproject.toml in effect (e.g. when invoked from another cwd).
+without pyproject.toml in effect (e.g. when invoked from another cwd), and
+clears the Django cache between tests.
 """
 
 import os
 
+import pytest
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "billable.tests.test_settings")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Drop cached entries so tests do not see each other's data."""
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
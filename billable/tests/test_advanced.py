@@ -129,6 +129,8 @@ class TestIdempotency:
         assert res2["success"] is True
         assert "idempotent" in res2["message"]
         assert TransactionService.get_balance(test_user.id, "tokens") == 90 # Still 90
+        assert res2["usage_id"] == res1["usage_id"]
+        assert str(Transaction.objects.get(idempotency_key="unique_key_123").id) == res1["usage_id"]
 
 @pytest.mark.django_db
 class TestSignals:
@@ -7,7 +7,7 @@ from asgiref.sync import sync_to_async
 from billable.models import Product, Offer, OfferItem, QuotaBatch, Order, OrderItem, ExternalIdentity, Referral, TrialHistory, Transaction
 from ninja.testing import TestAsyncClient
 from billable.api import router
-from billable.services import TransactionService, BalanceService, OrderService
+from billable.services import TransactionService, BalanceService, OrderService, CustomerService
 
 User = get_user_model()
 
@@ -170,6 +170,32 @@ class TestBillableAPI:
         assert res.status_code == 200
         data = res.json()
         assert [o["sku"] for o in data] == [sku_b]
+
+    async def test_catalog_metadata_only_on_include(self, api_client, bundle_offer):
+        """GET /catalog omits offer metadata unless include=metadata is passed."""
+        bundle_offer.metadata = {"badge": "hot"}
+        await sync_to_async(bundle_offer.save)()
+
+        res = await api_client.get(f"/catalog?sku={bundle_offer.sku}")
+        assert res.status_code == 200
+        assert res.json()[0]["metadata"] == {}
+        assert len(res.json()[0]["items"]) == 2
+
+        res_full = await api_client.get(f"/catalog?sku={bundle_offer.sku}&include=metadata")
+        assert res_full.status_code == 200
+        assert res_full.json()[0]["metadata"] == {"badge": "hot"}
+
+    async def test_catalog_cache_invalidated_on_offer_save(self, api_client, bundle_offer):
+        """Cached GET /catalog/{sku} response is refreshed after the offer is saved."""
+        res = await api_client.get(f"/catalog/{bundle_offer.sku}")
+        assert res.json()["name"] == "Starter Bundle"
+
+        bundle_offer.name = "Renamed Bundle"
+        await sync_to_async(bundle_offer.save)()
+
+        res = await api_client.get(f"/catalog/{bundle_offer.sku}")
+        assert res.json()["name"] == "Renamed Bundle"
+
     async def test_get_product_by_key(self, api_client, tokens_product):
         response = await api_client.get(f"/products/{tokens_product.product_key}")
         assert response.status_code == 200
@@ -205,6 +231,51 @@ class TestBillableAPI:
 
     # --- Complex Ordering ---
 
+    async def test_identity_token_resolves_user_on_write(self, api_client, tokens_product):
+        """identity_token from /identify resolves the user in POST bodies; a bad token is ignored."""
+        res = await api_client.post("/identify", json={"provider": "telegram", "external_id": "7777"})
+        assert res.status_code == 200
+        user_id = res.json()["user_id"]
+        token = res.json()["identity_token"]
+        await sync_to_async(QuotaBatch.objects.create)(
+            user_id=user_id, product=tokens_product, initial_quantity=5, remaining_quantity=5
+        )
+
+        res_c = await api_client.post("/wallet/consume", json={
+            "identity_token": token, "product_key": "TOKENS", "action_type": "usage"
+        })
+        assert res_c.status_code == 200
+        tx = await Transaction.objects.filter(direction=Transaction.Direction.DEBIT).afirst()
+        assert tx.user_id == user_id
+
+        res_bad = await api_client.post("/wallet/consume", json={
+            "identity_token": token + "x", "product_key": "TOKENS", "action_type": "usage"
+        })
+        assert res_bad.status_code == 400
+
+    async def test_identity_token_follows_merged_identity(self, api_client, test_user, tokens_product):
+        """A token issued before a merge resolves to the target user; a deleted identity is rejected."""
+        res = await api_client.post("/identify", json={"provider": "telegram", "external_id": "8888"})
+        source_id = res.json()["user_id"]
+        token = res.json()["identity_token"]
+        await CustomerService.amerge_customers(test_user.id, source_id)
+        await sync_to_async(QuotaBatch.objects.create)(
+            user=test_user, product=tokens_product, initial_quantity=5, remaining_quantity=5
+        )
+
+        res_c = await api_client.post("/wallet/consume", json={
+            "identity_token": token, "product_key": "TOKENS", "action_type": "usage"
+        })
+        assert res_c.status_code == 200
+        tx = await Transaction.objects.filter(direction=Transaction.Direction.DEBIT).afirst()
+        assert tx.user_id == test_user.id
+
+        await ExternalIdentity.objects.filter(provider="telegram", external_id="8888").adelete()
+        res_gone = await api_client.post("/wallet/consume", json={
+            "identity_token": token, "product_key": "TOKENS", "action_type": "usage"
+        })
+        assert res_gone.status_code == 400
+
     async def test_complex_order_flow(self, api_client, test_user, bundle_offer, credit_offer):
         # 1. Create order with multiple different offers
         payload = {
@@ -290,6 +361,8 @@ class TestBillableAPI:
         active_batches = res_b.json()
         assert len(active_batches) == 1
         assert active_batches[0]["remaining_quantity"] == 5
+        # Batches without expiry omit the null field
+        assert "expires_at" not in active_batches[0]
 
     async def test_wallet_consume_metadata_stored_and_returned(
         self, api_client, test_user, tokens_product
@@ -442,6 +515,25 @@ class TestBillableAPI:
         assert res_s2.status_code == 200
         assert res_s2.json()["data"]["count"] == 1
 
+    async def test_wallet_transactions_keyset_pagination(self, api_client, test_user, bundle_offer, monkeypatch):
+        """GET /wallet/transactions pages through the ledger via X-Next-Cursor without overlap."""
+        import billable.api
+        monkeypatch.setattr(billable.api, "TRANSACTIONS_PAGE_SIZE", 1)
+        await TransactionService.agrant_offer(test_user.id, bundle_offer)
+
+        res_1 = await api_client.get(f"/wallet/transactions?user_id={test_user.id}")
+        assert res_1.status_code == 200
+        assert len(res_1.json()) == 1
+        cursor = res_1["X-Next-Cursor"]
+
+        res_2 = await api_client.get(f"/wallet/transactions?user_id={test_user.id}&cursor={cursor}")
+        assert res_2.status_code == 200
+        assert len(res_2.json()) == 1
+        assert res_2.json()[0]["id"] != res_1.json()[0]["id"]
+
+        res_bad = await api_client.get(f"/wallet/transactions?user_id={test_user.id}&cursor=garbage")
+        assert res_bad.status_code == 400
+
     # --- Trial Edge Case (Double usage with different providers) ---
 
     async def test_trial_grant_creates_trial_history_record(self, api_client, test_user, tg_identity):
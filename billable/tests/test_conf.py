@@ -0,0 +1,15 @@
+"""Tests for the billable settings wrapper."""
+
+from django.test import override_settings
+
+from billable.conf import billable_settings
+
+
+def test_settings_are_cached_and_reloaded_on_override() -> None:
+    """Cached values follow override_settings and are restored afterwards."""
+    original = billable_settings.API_TITLE
+
+    with override_settings(BILLABLE_API_TITLE="Overridden"):
+        assert billable_settings.API_TITLE == "Overridden"
+
+    assert billable_settings.API_TITLE == original
@@ -105,6 +105,18 @@ class TestCustomerMerge:
         assert stats["moved_referrals"] == 1 # it was moved then deleted
         assert Referral.objects.filter(referrer=target_user, referee=target_user).count() == 0
 
+    def test_merge_referrals_both_sides(self, target_user, source_user):
+        # source_user invited one user and was invited by another
+        invitee = User.objects.create(username="invitee")
+        inviter = User.objects.create(username="inviter")
+        Referral.objects.create(referrer=source_user, referee=invitee)
+        Referral.objects.create(referrer=inviter, referee=source_user)
+
+        stats = CustomerService.merge_customers(target_user.id, source_user.id)
+        assert stats["moved_referrals"] == 2
+        assert Referral.objects.filter(referrer=target_user, referee=invitee).exists()
+        assert Referral.objects.filter(referrer=inviter, referee=target_user).exists()
+
     def test_merge_signal_sent(self, target_user, source_user):
         signal_received = False
         def handler(sender, **kwargs):
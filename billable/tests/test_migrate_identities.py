@@ -44,6 +44,46 @@ class TestMigrateIdentitiesCommand:
         assert "Created: 0" in out.getvalue()
         assert "skipped (already exist): 1" in out.getvalue()
 
+    def test_rerun_skips_identifiers_stored_stripped(self) -> None:
+        """Identifiers with surrounding whitespace are matched trimmed on reruns."""
+        User = get_user_model()
+        User.objects.create_user(username="  padded  ", password="x")
+
+        call_command("migrate_identities", "username", "telegram", stdout=StringIO(), stderr=StringIO())
+        assert ExternalIdentity.objects.filter(provider="telegram", external_id="padded").count() == 1
+
+        out = StringIO()
+        call_command("migrate_identities", "username", "telegram", stdout=out, stderr=StringIO())
+
+        assert "Created: 0" in out.getvalue()
+        assert "skipped (already exist): 1" in out.getvalue()
+
+    def test_created_counts_only_inserted_rows(self) -> None:
+        """Users sharing an identifier create one identity and are reported as skipped."""
+        User = get_user_model()
+        User.objects.create_user(username="a", first_name="shared", password="x")
+        User.objects.create_user(username="b", first_name="shared", password="x")
+
+        out = StringIO()
+        call_command("migrate_identities", "first_name", "telegram", stdout=out, stderr=StringIO())
+
+        assert ExternalIdentity.objects.filter(provider="telegram", external_id="shared").count() == 1
+        assert "Created: 1" in out.getvalue()
+        assert "skipped (already exist): 1" in out.getvalue()
+
+    def test_empty_values_are_skipped(self) -> None:
+        """Users with an empty or whitespace-only field value get no identity."""
+        User = get_user_model()
+        User.objects.create_user(username="u1", password="x", first_name="")
+        User.objects.create_user(username="u2", password="x", first_name="   ")
+        User.objects.create_user(username="u3", password="x", first_name=" alice ")
+
+        out = StringIO()
+        call_command("migrate_identities", "first_name", "telegram", stdout=out, stderr=StringIO())
+
+        assert list(ExternalIdentity.objects.filter(provider="telegram").values_list("external_id", flat=True)) == ["alice"]
+        assert "Created: 1" in out.getvalue()
+
     def test_dry_run_creates_nothing(self) -> None:
         """With --dry-run no ExternalIdentity records are created."""
         User = get_user_model()
@@ -89,6 +129,31 @@ class TestMigrateIdentitiesCommand:
         assert "has no field 'nonexistent_field'" in err.getvalue()
         assert ExternalIdentity.objects.filter(provider="telegram").count() == 0
 
+    def test_non_concrete_field_writes_error_and_creates_nothing(self) -> None:
+        """A relation without a column (M2M) is rejected instead of being read per user."""
+        User = get_user_model()
+        User.objects.create_user(username="u1", password="x")
+
+        err = StringIO()
+        call_command("migrate_identities", "groups", "telegram", stdout=StringIO(), stderr=err)
+
+        assert "is not a concrete column" in err.getvalue()
+        assert ExternalIdentity.objects.filter(provider="telegram").count() == 0
+
+    def test_workers_rejected_on_sqlite(self) -> None:
+        """--workers needs concurrent writers; on SQLite the command refuses to start."""
+        User = get_user_model()
+        User.objects.create_user(username="u1", password="x")
+
+        err = StringIO()
+        call_command(
+            "migrate_identities", "username", "telegram", "--workers=2",
+            stdout=StringIO(), stderr=err,
+        )
+
+        assert "not supported on SQLite" in err.getvalue()
+        assert ExternalIdentity.objects.filter(provider="telegram").count() == 0
+
     def test_two_runs_different_fields_create_two_identities_per_user(self) -> None:
         """Run command twice with different field and provider: one user gets two ExternalIdentity records."""
         User = get_user_model()
@@ -1,7 +1,7 @@
 import pytest
 from django.core.exceptions import ValidationError
 from django.contrib.admin.sites import AdminSite
-from billable.models import Product, Offer, OfferItem, ExternalIdentity
+from billable.models import Product, Offer, OfferItem, ExternalIdentity, TrialHistory, Order, OrderItem
 from django.contrib.auth import get_user_model
 from billable.admin import ProductAdmin
 from django.test import RequestFactory
@@ -34,6 +34,15 @@ class TestSharedNamespace:
         
         assert "Conflict: 'CONFLICTING_KEY' is already used as a Product Key." in str(excinfo.value)
 
+    def test_conflict_detected_before_uppercase_normalization(self):
+        """Test that a lowercase key conflicts with the uppercase key it will be saved as."""
+        Offer.objects.create(sku="CONFLICTING_KEY", name="Test Offer", price=100, currency="USD")
+
+        product = Product(product_key="conflicting_key", name="Test Product", product_type=Product.ProductType.QUANTITY)
+
+        with pytest.raises(ValidationError):
+            product.clean()
+
     def test_no_conflict_different_keys(self):
         """Test that no validation error occurs when keys are different."""
         Product.objects.create(product_key="prod_key", name="Test Product", product_type=Product.ProductType.QUANTITY)
@@ -159,6 +168,19 @@ class TestExternalIdentity:
         assert found_user == user
         assert found_user.username == "asyncuser"
 
+    def test_get_users_by_identities_batch(self, django_assert_num_queries):
+        """Test that get_users_by_identities resolves many pairs with one query."""
+        user = User.objects.create(username="batchuser")
+        ExternalIdentity.objects.create(provider="telegram", external_id="111", user=user)
+        ExternalIdentity.objects.create(provider="n8n", external_id="111", user=None)
+
+        with django_assert_num_queries(1):
+            users = ExternalIdentity.get_users_by_identities(
+                [("telegram", 111), ("n8n", "111"), ("telegram", "missing")]
+            )
+
+        assert users == {("telegram", "111"): user, ("n8n", "111"): None, ("telegram", "missing"): None}
+
     @pytest.mark.asyncio
     async def test_aget_user_by_identity_not_found(self):
         """Test that aget_user_by_identity returns None asynchronously when not found."""
@@ -202,3 +224,55 @@ class TestExternalIdentity:
         user = await User.objects.acreate(username="asyncuser_extid_notfound")
         external_id = await ExternalIdentity.aget_external_id_for_user(user, provider="telegram")
         assert external_id is None
+
+
+@pytest.mark.django_db
+class TestTrialHistory:
+    """Tests for TrialHistory identity lookups."""
+
+    def test_has_used_trial_matches_any_identity(self):
+        """Test that one matching identity out of several is enough."""
+        TrialHistory.objects.create(
+            identity_type="email",
+            identity_hash=TrialHistory.generate_identity_hash("User@Example.com"),
+            trial_plan_name="welcome",
+        )
+
+        assert TrialHistory.has_used_trial({"telegram": 42, "email": " user@example.com "})
+        assert not TrialHistory.has_used_trial({"telegram": 42, "email": "other@example.com"})
+        assert not TrialHistory.has_used_trial({"email": None})
+
+    def test_generate_identity_hashes_matches_single_hash(self):
+        """Test that the batch helper produces the same hashes as the single-value one."""
+        values = ["User@Example.com", 42, None]
+        assert TrialHistory.generate_identity_hashes(values) == [
+            TrialHistory.generate_identity_hash(value) for value in values
+        ]
+
+
+@pytest.mark.django_db
+class TestOrderOffers:
+    """Tests for Order offer accessors."""
+
+    def test_get_offers_single_query(self, django_assert_num_queries):
+        """Test that get_offers loads all offers of the order in one query."""
+        user = User.objects.create(username="order_offers")
+        first = Offer.objects.create(sku="first", name="First", price=1, currency="USD")
+        second = Offer.objects.create(sku="second", name="Second", price=2, currency="USD")
+        order = Order.objects.create(user=user, total_amount=3, currency="USD")
+        OrderItem.objects.create(order=order, offer=first, price=1)
+        OrderItem.objects.create(order=order, offer=second, price=2)
+
+        with django_assert_num_queries(1):
+            assert order.get_offers() == [first, second]
+
+    def test_get_offers_uses_prefetched_items(self, django_assert_num_queries):
+        """Test that orders loaded with with_items() resolve offers without queries."""
+        user = User.objects.create(username="order_prefetch")
+        offer = Offer.objects.create(sku="prefetched", name="Prefetched", price=1, currency="USD")
+        order = Order.objects.create(user=user, total_amount=1, currency="USD")
+        OrderItem.objects.create(order=order, offer=offer, price=1)
+
+        order = Order.objects.with_items().get(pk=order.pk)
+        with django_assert_num_queries(0):
+            assert order.get_offers() == [offer]
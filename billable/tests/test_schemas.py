@@ -0,0 +1,45 @@
+"""Autotests for response schema mapping from ORM objects and dicts."""
+
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from billable.models import Offer, Order, OrderItem, Product, QuotaBatch
+from billable.schemas import ActiveBatchSchema, OrderItemSchema
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+class TestResponseSchemas:
+    """Tests for computed fields and aliases on response schemas."""
+
+    def test_active_batch_computed_fields(self) -> None:
+        """used_quantity and is_active are derived from the batch; state is not exposed."""
+        user = User.objects.create(username="schema_user")
+        product = Product.objects.create(product_key="schema_p", name="P", product_type=Product.ProductType.QUANTITY)
+        batch = QuotaBatch.objects.create(
+            user=user, product=product, initial_quantity=10, remaining_quantity=4,
+            state=QuotaBatch.State.EXHAUSTED,
+        )
+
+        data = ActiveBatchSchema.model_validate(batch).model_dump()
+
+        assert data["total_quantity"] == 10
+        assert data["used_quantity"] == 6
+        assert data["is_active"] is False
+        assert "state" not in data
+
+    def test_order_item_sku_from_model_and_dict(self) -> None:
+        """OrderItemSchema reads the SKU from item.offer.sku or from a 'sku' key."""
+        user = User.objects.create(username="schema_order")
+        offer = Offer.objects.create(sku="schema_sku", name="O", price=1, currency="USD")
+        order = Order.objects.create(user=user, total_amount=1, currency="USD")
+        item = OrderItem.objects.create(order=order, offer=offer, quantity=2, price=1)
+
+        from_model = OrderItemSchema.model_validate(item)
+        from_dict = OrderItemSchema.model_validate({"id": item.id, "sku": "SCHEMA_SKU", "quantity": 2, "price": Decimal("1")})
+
+        assert from_model.sku == from_dict.sku == "SCHEMA_SKU"
+        assert from_model.model_dump(by_alias=True)["offer_sku"] == "SCHEMA_SKU"
@@ -88,6 +88,14 @@ class TestServicesSyncAsync:
         assert res["success"] is True
         assert res["remaining"] == 70
 
+    def test_grant_offers_bulk(self, test_user, basic_offer, exchange_offer):
+        batches = TransactionService.grant_offers_bulk(
+            test_user.id, [(basic_offer, None), (exchange_offer, None)], source="import"
+        )
+        assert [b.initial_quantity for b in batches] == [100, 50]
+        assert TransactionService.get_balance(test_user.id, "GEN_AI") == 150
+        assert Transaction.objects.filter(user=test_user, action_type="import").count() == 2
+
     @pytest.mark.asyncio
     async def test_transaction_service_async(self, test_user, basic_offer):
         # 1. Grant (Sync only, typically called from Task or Payment Hook)
@@ -155,6 +163,20 @@ class TestServicesSyncAsync:
         assert len(data["items"]) == 1
         assert data["items"][0]["sku"] == basic_offer.sku
 
+    def test_create_orders_bulk(self, test_user, basic_offer):
+        other = User.objects.create(username="bulkbuyer")
+        carts = [
+            {"user_id": test_user.id, "items": [{"sku": basic_offer.sku, "quantity": 2}]},
+            {"user_id": other.id, "items": [{"sku": basic_offer.sku.lower(), "quantity": 1}], "metadata": {"src": "import"}},
+        ]
+        orders = OrderService.create_orders_bulk(carts)
+
+        assert [o.user_id for o in orders] == [test_user.id, other.id]
+        assert orders[0].total_amount == Decimal("20.00")
+        assert orders[1].metadata == {"src": "import"}
+        assert OrderItem.objects.filter(order__in=orders).count() == 2
+        assert OrderItem.objects.get(order=orders[0]).quantity == 2
+
     def test_order_create_raises_on_unknown_sku(self, test_user):
         """create_order raises ValueError when offer for sku is not found."""
         items = [{"sku": "nonexistent_sku_xyz", "quantity": 1}]
@@ -192,6 +214,39 @@ class TestServicesSyncAsync:
         summary = BalanceService.get_balance_summary(test_user.id)
         assert summary["GEN_AI"]["remaining"] == 40
 
+    def test_balance_summary_aggregates_batches(self, test_user, qty_product):
+        """Summary sums all active batches of a product_key and keeps the earliest expiry."""
+        soon = timezone.now() + timedelta(days=1)
+        later = timezone.now() + timedelta(days=5)
+        for initial, remaining, expires_at in ((50, 40, later), (10, 10, soon), (5, 0, None)):
+            QuotaBatch.objects.create(
+                user=test_user, product=qty_product, initial_quantity=initial,
+                remaining_quantity=remaining, expires_at=expires_at, state=QuotaBatch.State.ACTIVE
+            )
+        QuotaBatch.objects.create(
+            user=test_user, product=qty_product, initial_quantity=100, remaining_quantity=100,
+            state=QuotaBatch.State.REVOKED
+        )
+
+        summary = BalanceService.get_balance_summary(test_user.id)
+
+        assert summary == {
+            "GEN_AI": {"total": 65, "used": 15, "remaining": 50, "is_unlimited": False, "expiry": soon}
+        }
+
+    def test_balance_summary_cache_invalidated_on_batch_change(self, test_user, qty_product):
+        """Cached summary is dropped when the user's batches change."""
+        batch = QuotaBatch.objects.create(
+            user=test_user, product=qty_product, initial_quantity=10, remaining_quantity=10,
+            state=QuotaBatch.State.ACTIVE
+        )
+        assert BalanceService.get_balance_summary(test_user.id)["GEN_AI"]["remaining"] == 10
+
+        batch.remaining_quantity = 3
+        batch.save(update_fields=["remaining_quantity"])
+
+        assert BalanceService.get_balance_summary(test_user.id)["GEN_AI"]["remaining"] == 3
+
     @pytest.mark.asyncio
     async def test_balance_service_async(self, test_user, qty_product):
         # Setup manual batch
@@ -47,3 +47,7 @@ CELERY_TASK_ALWAYS_EAGER = True
 # Token for API testing
 BILLABLE_API_TOKEN = "test_billing_token_123"
 N8N_SERVICE_KEY = "test_n8n_service_key_123"
+
+# Tests run in one process, so the per-process LocMemCache is coherent here
+BILLABLE_CATALOG_CACHE_TTL = 30
+BILLABLE_BALANCE_CACHE_TTL = 60
@@ -2,6 +2,7 @@
 
 import pytest
 from django.contrib.auth import get_user_model
+from django.db.models import F
 from billable.models import Product, Offer, TrialHistory
 from ninja.testing import TestAsyncClient
 from billable.api import router
@@ -47,6 +48,17 @@ class TestProductKeyNormalization:
         product.refresh_from_db()
         assert product.product_key == "UPDATED_KEY"
 
+    def test_product_key_normalized_on_expression_update(self):
+        """Test that an expression passed to QuerySet.update() is uppercased in SQL."""
+        product = Product.objects.create(
+            product_key="original",
+            name="from_name",
+            product_type=Product.ProductType.QUANTITY
+        )
+        Product.objects.filter(pk=product.pk).update(product_key=F("name"))
+        product.refresh_from_db()
+        assert product.product_key == "FROM_NAME"
+
     def test_product_key_normalized_on_bulk_create(self):
         """Test that product_key is normalized when using bulk_create."""
         products = [
@@ -57,6 +69,18 @@ class TestProductKeyNormalization:
         assert Product.objects.get(product_key="BULK1").product_key == "BULK1"
         assert Product.objects.get(product_key="BULK2").product_key == "BULK2"
 
+    def test_product_key_normalized_on_bulk_create_dicts(self):
+        """Test that bulk_create_dicts inserts rows with defaults and uppercase keys."""
+        inserted = Product.objects.bulk_create_dicts([
+            {"product_key": "dict1", "name": "Dict 1", "product_type": Product.ProductType.QUANTITY},
+            {"product_key": "dict2", "name": "Dict 2", "product_type": Product.ProductType.PERIOD, "metadata": {"a": 1}},
+        ])
+        assert inserted == 2
+        product = Product.objects.get(product_key="DICT2")
+        assert product.metadata == {"a": 1}
+        assert product.is_active is True
+        assert product.created_at is not None
+
     def test_product_key_none_handled(self):
         """Test that None product_key is handled correctly."""
         product = Product.objects.create(
@@ -14,9 +14,34 @@ from .conf import billable_settings
 SHOW_DOCS = billable_settings.SHOW_DOCS
 API_TITLE = billable_settings.API_TITLE
 
+
+class BillableNinjaAPI(NinjaAPI):
+    """NinjaAPI that builds the OpenAPI schema once per mount point.
+
+    The schema only changes when routers are added, so the generated schema is
+    cached per (path_prefix, path_params) and dropped on add_router().
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._openapi_schema_cache = {}
+        super().__init__(*args, **kwargs)
+
+    def add_router(self, *args, **kwargs):
+        self._openapi_schema_cache.clear()
+        return super().add_router(*args, **kwargs)
+
+    def get_openapi_schema(self, *, path_prefix=None, path_params=None):
+        key = (path_prefix, tuple(sorted((path_params or {}).items())))
+        schema = self._openapi_schema_cache.get(key)
+        if schema is None:
+            schema = super().get_openapi_schema(path_prefix=path_prefix, path_params=path_params)
+            self._openapi_schema_cache[key] = schema
+        return schema
+
+
 # 2. Create API instance
 # If SHOW_DOCS=False, pass None, which disables documentation path generation
-api = NinjaAPI(
+api = BillableNinjaAPI(
     title=API_TITLE,
     docs_url="/docs" if SHOW_DOCS else None,
     urls_namespace="billable_default_api",  # To avoid conflicts with other APIs
@@ -33,7 +58,7 @@ api.add_router("", billing_router)
 # This matches the working pattern: path("api/v1/", api.urls)
 
 # Export api object for advanced usage (adding routers, exception handlers, etc.)
-__all__ = ['api', 'urlpatterns']
+__all__ = ['BillableNinjaAPI', 'api', 'urlpatterns']
 
 # Export api.urls as urlpatterns for direct use in path()
 # Usage: path("api/v1/billing/", billable.urls.urlpatterns)